@@ -1,90 +1,202 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status, WebSocket, Query
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+import jwt
+from jwt import PyJWTError
 from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from src.database import get_db
-from src.auth import schemas, models
+from src.database import get_db, get_async_db
+from src.auth import models
 from src.config import settings
 from src.auth.models import User
-
-# OAuth2 anquan fangshi ,zhiding token de URL
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
+from src.auth.security import oauth2_scheme
 
 FORBIDDEN_EXCEPTION = HTTPException(
     status_code=status.HTTP_403_FORBIDDEN,
     detail="The user does not have enough privileges",
 )
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    """
+    构造认证失败时抛出的 401 异常。
+
+    每次抛出都新建实例：反复抛出同一个异常对象会让它的 __traceback__ 不断累积栈帧，
+    并一直引用这些栈帧中的 token、数据库会话等局部变量。
+    """
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+# WebSocket 认证失败时的关闭原因
+WS_REASON_MISSING_SUBJECT = "Token 无效: 缺少用户信息"
+WS_REASON_DECODE_FAILED = "Token 无效: 解码失败"
+WS_REASON_MALFORMED = "Token 无效: 格式错误"
+WS_REASON_USER_NOT_FOUND = "用户不存在"
+
+# 已认证用户缓存
+# 同一个 token 在有效期内会被反复携带，缓存其对应的用户快照可以同时省去 JWT 解码和按用户名查库。
+# 键为 token 的 SHA-256 摘要，避免在内存中保存原始 token；值为 (CachedUser, 过期时间戳)。
+TOKEN_CACHE_TTL_SECONDS = 30
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
+
+# jwt.decode 的参数在进程生命周期内不变，导入时构造一次，避免每个请求重复创建
+_JWT_KEY = settings.SECRET_KEY
+_JWT_ALGORITHMS = (settings.ALGORITHM,)
+_JWT_DECODE_OPTIONS = {"verify_aud": False}
+
+
+@dataclass(frozen=True, slots=True)
+class CachedUser:
+    """
+    缓存在进程内存中的用户快照。
+
+    只包含下游代码会读取的字段（id、username、is_super_admin 等），不绑定任何数据库会话，
+    因此可以安全地跨请求复用。
+    """
+    id: int
+    username: str
+    email: str
+    is_super_admin: bool
+    pushme_key: str | None
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            is_super_admin=user.is_super_admin,
+            pushme_key=user.pushme_key,
+        )
+
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def _get_cached_user(key: bytes) -> CachedUser | None:
+    """返回缓存中仍在有效期内的用户快照，未命中时返回 None。"""
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None and time.time() < cached[1]:
+        return cached[0]
+    return None
+
+
+def _cache_user(key: bytes, user: User, payload: dict) -> CachedUser:
+    """
+    为用户生成快照并写入缓存。
+
+    缓存条目的存活时间取 TOKEN_CACHE_TTL_SECONDS 与 token 剩余有效期中的较小值，
+    因此已过期的 token 永远不会从缓存中命中。
+    """
+    snapshot = CachedUser.from_user(user)
+    now = time.time()
+    expires_at = min(now + TOKEN_CACHE_TTL_SECONDS, payload.get("exp", now))
+    with _token_cache_lock:
+        _token_cache[key] = (snapshot, expires_at)
+    return snapshot
+
+
+def _decode_token(token: str) -> dict:
+    """
+    解码并校验 JWT。
+
+    Raises:
+        PyJWTError: 如果 token 无效或已过期。
+    """
+    return jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGORITHMS, options=_JWT_DECODE_OPTIONS)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CachedUser:
+    key = _token_cache_key(token)
+    cached_user = _get_cached_user(key)
+    if cached_user is not None:
+        return cached_user
+
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+        payload = _decode_token(token)
+    except PyJWTError:
+        raise _credentials_exception()
+    username: str = payload.get("sub")
+    if not username:
+        raise _credentials_exception()
+    user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    return _cache_user(key, user, payload)
+
 
 async def get_current_user_from_websocket(
     websocket: WebSocket,
     token: str = Query(...),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> CachedUser:
     """
     一个专门用于 WebSocket 连接的依赖项，用于从查询参数中获取和验证用户身份。
     
     Args:
         websocket: WebSocket 连接对象。
         token: 从查询参数 `?token=...` 中自动提取的 JWT。
-        db: 数据库会话依赖。
+        db: 异步数据库会话依赖。
         
     Returns:
-        如果 token 有效，返回 User ORM 对象。
+        如果 token 有效，返回用户快照 CachedUser。
         
     Raises:
         WebSocketException: 如果 token 无效或用户不存在，则关闭连接。
     """
+    key = _token_cache_key(token)
+    cached_user = _get_cached_user(key)
+    if cached_user is not None:
+        return cached_user
+
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        payload = _decode_token(token)
         # 从 payload 中获取用户名 (subject)
         username: str = payload.get("sub")
         if username is None:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token 无效: 缺少用户信息")
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=WS_REASON_MISSING_SUBJECT)
             return None
 
-    except JWTError:
+    except PyJWTError:
         # 如果 token 解码失败
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token 无效: 解码失败")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=WS_REASON_DECODE_FAILED)
         return None
     except ValidationError:
         # 如果 token 格式不正确
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token 无效: 格式错误")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=WS_REASON_MALFORMED)
         return None
 
     # 从数据库中查找用户
-    user = db.query(User).filter(User.username == username).first()
+    user = (await db.execute(select(User).where(User.username == username))).scalars().first()
     if user is None:
         # 如果数据库中不存在该用户
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="用户不存在")
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=WS_REASON_USER_NOT_FOUND)
         return None
         
-    return user
+    return _cache_user(key, user, payload)
 
-def get_super_admin(current_user: models.User = Depends(get_current_user)) -> models.User:
+async def get_super_admin(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> CachedUser:
     """
     一个简单的依赖，用于校验当前用户是否为超级管理员。
+
+    直接依赖 token 而不是 get_current_user：用户快照缓存命中时（管理面板的轮询请求大多如此）
+    只需一次缓存查询即可完成校验，未命中时才走完整的认证流程。
     """
+    current_user = _get_cached_user(_token_cache_key(token))
+    if current_user is None:
+        current_user = await get_current_user(token=token, db=db)
     if not current_user.is_super_admin:
         raise FORBIDDEN_EXCEPTION
-    return current_user 
\ No newline at end of file
+    return current_user
@@ -1,6 +1,7 @@
 from datetime import timedelta
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import Response as RawResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
@@ -17,9 +18,19 @@ router = APIRouter(
     tags=["auth"],  # 在 OpenAPI 文档中为这些路由分组
 )
 
+
+def _render(payload: Response) -> RawResponse:
+    """
+    直接输出已经构造好的响应模型。
+
+    路由函数返回 Response 对象时，FastAPI 会跳过 response_model 的二次校验与 jsonable_encoder，
+    由 Pydantic 的 Rust 序列化器一次性生成 JSON。response_model 仍保留用于 OpenAPI 文档。
+    """
+    return RawResponse(content=payload.model_dump_json(), media_type="application/json")
+
 # 在这里可以添加路由...
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
     用户登录以获取访问令牌。
 
@@ -33,7 +44,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     Returns:
         schemas.Token: 包含访问令牌和令牌类型的 Pydantic 模型，FastAPI 会将其序列化为 JSON。
     """
-    user = service.authenticate_user(db, username=form_data.username, password=form_data.password)
+    user = await service.authenticate_user(db, username=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,7 +59,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     return token_data
 
 @router.get("/users/me", response_model=Response[schemas.User])
-def read_users_me(current_user: schemas.User = Depends(get_current_user)):
+async def read_users_me(current_user: schemas.User = Depends(get_current_user)):
     """
     获取当前登录用户的信息。
 
@@ -58,10 +69,10 @@ def read_users_me(current_user: schemas.User = Depends(get_current_user)):
     Returns:
         Response[schemas.User]: 包含用户信息的标准响应。
     """
-    return Response(data=current_user)
+    return _render(Response[schemas.User](data=schemas.User.model_validate(current_user)))
 
 @router.get("/users/me/admin", response_model=Response[dict])
-def read_own_items(
+async def read_own_items(
     current_user: schemas.User = Depends(get_super_admin)
 ):
     """
@@ -70,7 +81,7 @@ def read_own_items(
     return Response(data={"message": f"Welcome super admin {current_user.username}"})
 
 @router.post("/users/register", response_model=Response[schemas.User])
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """
     注册一个新用户。
 
@@ -89,12 +100,12 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     # 创建新用户
-    new_user = service.create_user(db=db, user=user)
-    return Response(data=new_user)
+    new_user = await service.create_user(db=db, user=user)
+    return _render(Response[schemas.User](data=schemas.User.model_validate(new_user)))
 
 
 @router.get("/users", response_model=Response[List[schemas.User]])
-def read_users(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_super_admin)):
+async def read_users(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_super_admin)):
     """
     获取所有用户的列表。
 
@@ -108,5 +119,5 @@ def read_users(db: Session = Depends(get_db), current_user: schemas.User = Depen
         Response[List[schemas.User]]: 包含用户列表的标准响应。
     """
     users = service.get_users(db=db)
-    return Response(data=users)
+    return _render(Response[List[schemas.User]](data=users))
 
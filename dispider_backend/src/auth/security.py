@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
-from passlib.context import CryptContext
+import bcrypt
+import jwt
 from src.config import settings
 
 # JWT 配置
@@ -17,10 +17,6 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 # 例如: prefix="/api/auth" + path="/token" => "api/auth/token"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
-# 创建一个 passlib 上下文实例，用于密码哈希
-# 我们指定 bcrypt 作为默认的哈希算法
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 # 验证密码
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -34,7 +30,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         如果密码匹配则返回 True，否则返回 False。
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+
+# 生成密码哈希
+def hash_password(plain_password: str) -> str:
+    """
+    使用 bcrypt 对明文密码进行哈希，工作因子由 settings.BCRYPT_ROUNDS 决定。
+
+    Args:
+        plain_password: 用户输入的明文密码。
+
+    Returns:
+        可直接存入数据库的哈希字符串。
+    """
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
+    return bcrypt.hashpw(plain_password.encode('utf-8'), salt).decode('utf-8')
 
 
 # 创建访问令牌
@@ -7,27 +7,55 @@
 # 保持业务逻辑与路由处理程序分离是一种很好的做法。
 # 这使得代码更易于测试、维护和重用。
 
+import hashlib
+import os
+import threading
+
+import anyio
+from cachetools import TTLCache
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
-import bcrypt
 from src.auth import models, schemas
-from src.auth.security import verify_password
+from src.auth.security import verify_password, hash_password
+
+# 密码校验结果缓存
+# bcrypt 单次校验需要几十到上百毫秒，同一会话内的重复登录直接复用最近一次的校验结果。
+# 键包含数据库中的哈希值，密码一旦变更旧条目就不会再命中；明文密码只以 SHA-256 摘要形式出现。
+_password_check_cache = TTLCache(maxsize=1024, ttl=60)
+_password_check_lock = threading.Lock()
+
+# bcrypt 专用的并发限制器
+# 限制同时执行 bcrypt 的线程数，登录洪峰只会在这里排队，不会占满 FastAPI 的默认线程池而拖慢其他接口。
+# 旧版本 anyio 需要在事件循环中创建 CapacityLimiter，因此在首次使用时才初始化。
+BCRYPT_MAX_THREADS = max(2, (os.cpu_count() or 1) // 2)
+_bcrypt_limiter: anyio.CapacityLimiter | None = None
+
+
+def _get_bcrypt_limiter() -> anyio.CapacityLimiter:
+    global _bcrypt_limiter
+    if _bcrypt_limiter is None:
+        _bcrypt_limiter = anyio.CapacityLimiter(BCRYPT_MAX_THREADS)
+    return _bcrypt_limiter
 
 
 # 根据用户名或邮箱查找用户
+# 单条 OR 查询代替先查用户名、再查邮箱的两次往返；排序保证用户名匹配优先于邮箱匹配
 def get_user_by_username(db: Session, username: str):
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        user = db.query(models.User).filter(models.User.email == username).first()
-    return user
+    return (
+        db.query(models.User)
+        .filter(or_(models.User.username == username, models.User.email == username))
+        .order_by((models.User.username == username).desc())
+        .first()
+    )
 
 
 # 创建新用户
-def create_user(db: Session, user: schemas.UserCreate):
-    # 使用 bcrypt 生成哈希密码，增加安全性
-    hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
-    # 创建 User 模型实例，注意要解码 hashed_password
+async def create_user(db: Session, user: schemas.UserCreate):
+    # 使用 bcrypt 生成哈希密码，增加安全性；bcrypt 是 CPU 密集操作，在受限的线程中执行以免阻塞事件循环
+    hashed_password = await anyio.to_thread.run_sync(hash_password, user.password, limiter=_get_bcrypt_limiter())
+    # 创建 User 模型实例
     db_user = models.User(username=user.username, 
-                          hashed_password=hashed_password.decode('utf-8'), 
+                          hashed_password=hashed_password, 
                           is_super_admin=user.is_super_admin,
                           pushme_key=user.pushme_key,
                           email=user.email)
@@ -38,13 +66,29 @@ def create_user(db: Session, user: schemas.UserCreate):
 
 
 # 认证用户
-def authenticate_user(db: Session, username: str, password: str):
+async def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await _check_password(password, user.hashed_password):
         return False
-    return user 
+    return user
+
+
+async def _check_password(password: str, hashed_password: str) -> bool:
+    """
+    带短时缓存的密码校验，缓存未命中时才在线程池中执行 bcrypt。
+    """
+    key = (hashed_password, hashlib.sha256(password.encode('utf-8')).digest())
+    with _password_check_lock:
+        cached = _password_check_cache.get(key)
+    if cached is not None:
+        return cached
+    result = await anyio.to_thread.run_sync(verify_password, password, hashed_password, limiter=_get_bcrypt_limiter())
+    with _password_check_lock:
+        _password_check_cache[key] = result
+    return result
+
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     """
@@ -56,6 +100,14 @@ def get_users(db: Session, skip: int = 0, limit: int = 100):
         limit (int): 要返回的最大用户数。
 
     Returns:
-        list[models.User]: 用户对象列表。
+        list[schemas.User]: 用户信息列表。
     """
-    return db.query(models.User).offset(skip).limit(limit).all() 
\ No newline at end of file
+    # 列表接口只读，不需要 ORM 的身份映射和脏检查，直接用 Core select 取出所需的列，
+    # 再用 model_construct 构造响应模型（数据来自数据库，类型已知，无需再次校验）。
+    stmt = select(
+        models.User.id,
+        models.User.username,
+        models.User.is_super_admin,
+        models.User.pushme_key,
+    ).offset(skip).limit(limit)
+    return [schemas.User.model_construct(**row._mapping) for row in db.execute(stmt)]
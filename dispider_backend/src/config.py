@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -36,7 +38,19 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7天，默认值
 
+    # Password hashing settings
+    BCRYPT_ROUNDS: int = 12  # bcrypt 的工作因子，每加 1 验证耗时约翻倍
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 
-settings = Settings() 
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    返回进程内唯一的 Settings 实例，.env 文件只解析一次。
+    可作为 FastAPI 依赖使用 (Depends(get_settings))，测试中通过 dependency_overrides 替换。
+    """
+    return Settings()
+
+
+settings = get_settings() 
\ No newline at end of file
@@ -2,15 +2,18 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 from typing import List, Dict, Any
 import redis
+import redis.asyncio
 # 导入 WebSocket 和相关异常
 from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 import asyncio # 导入 asyncio 用于并发处理
 
-from src.database import get_db
-from src.redis_client import get_redis_client
+from src.database import get_db, get_async_db
+from src.redis_client import get_redis_client, get_async_redis_client
 from src.auth.dependencies import get_current_user, get_current_user_from_websocket
 from src.auth.models import User
 from src.containers.service import container_service
@@ -25,6 +28,13 @@ from src.containers.schemas import (
 # 配置日志记录
 logger = logging.getLogger(__name__)
 
+# VNC 代理的读缓冲设置：单次读取 64 KiB，StreamReader 内部缓冲上限 1 MiB
+VNC_READ_CHUNK_SIZE = 64 * 1024
+VNC_STREAM_LIMIT = 1024 * 1024
+# VNC 代理的写缓冲水位为 256 KiB / 1 MiB：积压低于高水位时 drain 立即返回，突发输入由传输层缓冲
+VNC_WRITE_BUFFER_HIGH = 1024 * 1024
+VNC_WRITE_BUFFER_LOW = 256 * 1024
+
 # 创建一个 API 路由器，所有与容器相关的端点都在这里定义
 # 移除了 prefix="/projects"，将前缀统一到 main.py 中管理
 router = APIRouter(tags=["containers_by_project"])
@@ -40,6 +50,7 @@ def start_project_container_batch(
     project_id: int,
     request: BatchStartRequest,
     db: Session = Depends(get_db),
+    redis_client: redis.Redis = Depends(get_redis_client),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -48,21 +59,27 @@ def start_project_container_batch(
     - **project_id**: 容器所属项目的 ID。
     - **request**: 包含 `container_count` 和 `image` 的请求体。
     - **db**: 数据库会话依赖。
+    - **redis_client**: Redis 客户端依赖，用于分配端口。
     - **current_user**: 确保操作者已认证。
     """
     try:
         logger.info(f"用户 {current_user.username} (ID: {current_user.id}) 正在为项目 {project_id} 请求启动 {request.container_count} 个容器...")
         
-        started_containers = container_service.start_container_batch(
+        started_containers, failed_containers = container_service.start_container_batch(
             db=db,
+            redis_client=redis_client,
             project_id=project_id,
             request=request
         )
         
         logger.info(f"为项目 {project_id} 成功启动 {len(started_containers)} 个容器。")
+        message = f"成功请求启动 {len(started_containers)} 个容器。"
+        if failed_containers:
+            message += f" 另有 {len(failed_containers)} 个容器启动失败。"
         return {
-            "message": f"成功请求启动 {len(started_containers)} 个容器。",
-            "started_containers": started_containers
+            "message": message,
+            "started_containers": started_containers,
+            "failed_containers": failed_containers
         }
     except HTTPException as e:
         # 直接向上抛出由服务层或依赖项引发的 HTTP 异常
@@ -85,8 +102,8 @@ async def report_container_status(
     project_id: int,
     worker_id: str,
     request: ContainerStatusRequest,
-    db: Session = Depends(get_db),
-    redis_client: redis.Redis = Depends(get_redis_client)
+    db: AsyncSession = Depends(get_async_db),
+    redis_client: redis.asyncio.Redis = Depends(get_async_redis_client)
 ):
     """
     处理容器状态报告的 API 端点。
@@ -94,8 +111,8 @@ async def report_container_status(
     - **project_id**: 容器所属项目的 ID。
     - **worker_id**: 报告状态的容器的 worker_id。
     - **request**: 包含 `status` 和可选 `message` 的请求体。
-    - **db**: 数据库会话依赖。
-    - **redis_client**: Redis 客户端依赖。
+    - **db**: 异步数据库会话依赖。
+    - **redis_client**: 异步 Redis 客户端依赖。
     """
     try:
         await container_service.report_status(
@@ -120,18 +137,18 @@ async def report_container_status(
     summary="获取所有需要人工干预的容器警报",
     description="返回一个当前所有处于 'needs_manual_intervention' 状态的容器列表，供前端展示或监控使用。"
 )
-def get_all_container_alerts(
-    redis_client: redis.Redis = Depends(get_redis_client),
+async def get_all_container_alerts(
+    redis_client: redis.asyncio.Redis = Depends(get_async_redis_client),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取所有容器警报的 API 端点。
 
-    - **redis_client**: Redis 客户端依赖。
+    - **redis_client**: 异步 Redis 客户端依赖。
     - **current_user**: 确保只有登录用户才能访问。
     """
     try:
-        alerts = container_service.get_all_alerts(redis_client=redis_client)
+        alerts = await container_service.get_all_alerts(redis_client=redis_client)
         return alerts
     except Exception as e:
         logger.error(f"获取容器警报列表时出错: {e}", exc_info=True)
@@ -168,7 +185,7 @@ def list_containers(
 async def websocket_vnc_proxy(
     websocket: WebSocket,
     container_db_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     # 将认证依赖替换为专门为 WebSocket 创建的依赖
     current_user: User = Depends(get_current_user_from_websocket)
 ):
@@ -176,15 +193,17 @@ async def websocket_vnc_proxy(
     通过 WebSocket 代理到容器的 VNC 服务。
     这允许前端通过 FastAPI 后端安全地连接到容器的 VNC，而无需直接暴露端口。
     """
+    # 如果用户获取失败（例如 token 问题），current_user 会是 None，连接已在依赖项中关闭
+    if not current_user:
+        return
+
     # 1. 验证用户是否有权访问此容器
     # 使用我们之前在 service.py 中添加的方法
-    db_container = container_service.get_container_for_user(db, container_db_id, current_user)
+    db_container = await container_service.get_container_for_user(db, container_db_id, current_user)
+    # 权限校验后不再需要数据库，立即归还连接，避免在整个 VNC 会话期间占用连接池
+    await db.close()
     
     if not db_container:
-        # 在依赖项中已经处理了关闭，但为了保险起见，这里再次检查
-        # 如果用户获取失败（例如 token 问题），current_user 会是 None
-        if not current_user:
-            return
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="无权访问该容器或容器不存在")
         return
 
@@ -200,7 +219,8 @@ async def websocket_vnc_proxy(
     
     reader, writer = None, None
     try:
-        reader, writer = await asyncio.open_connection(target_host, target_port)
+        reader, writer = await asyncio.open_connection(target_host, target_port, limit=VNC_STREAM_LIMIT)
+        writer.transport.set_write_buffer_limits(high=VNC_WRITE_BUFFER_HIGH, low=VNC_WRITE_BUFFER_LOW)
         logger.info(f"成功连接到容器 {target_host}:{target_port} 的 VNC 服务")
 
         # 3. 创建两个任务，双向转发数据
@@ -213,29 +233,32 @@ async def websocket_vnc_proxy(
                     await writer.drain()
             except WebSocketDisconnect:
                 logger.info("客户端 WebSocket 连接已断开。")
-            finally:
-                if writer:
-                    writer.close()
-                    # await writer.wait_closed() # 在新版 asyncio 中可用
 
         async def forward_vnc_to_client():
             """从 VNC TCP 套接字接收数据并转发到客户端 WebSocket"""
             try:
-                while not reader.at_eof():
-                    data = await reader.read(1024)
-                    if not data:
-                        break
+                # VNC 帧缓冲更新通常很大，一次读取更多数据可以显著减少 WebSocket 帧数
+                while data := await reader.read(VNC_READ_CHUNK_SIZE):
                     await websocket.send_bytes(data)
             except Exception as e:
                 logger.error(f"从 VNC 转发数据到客户端时出错: {e}")
-            finally:
-                await websocket.close()
 
-        # 并发运行这两个任务
-        await asyncio.gather(
-            forward_client_to_vnc(),
-            forward_vnc_to_client()
-        )
+        # 并发运行这两个任务，任意一个方向结束后立即取消另一个方向，避免留下半开连接
+        # （运行环境为 Python 3.10，没有 asyncio.TaskGroup）
+        tasks = [
+            asyncio.create_task(forward_client_to_vnc()),
+            asyncio.create_task(forward_vnc_to_client()),
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()
+
+        # VNC 一侧先结束时，由这里统一关闭客户端 WebSocket
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
 
     except ConnectionRefusedError:
         logger.error(f"连接到 {target_host}:{target_port} 被拒绝。请检查目标容器服务是否正常运行。")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict
 
 # 定义启动容器批处理时的请求模型
@@ -21,13 +21,14 @@ class ContainerResponse(BaseModel):
     status: str
     project_id: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # 定义批量启动的响应模型
 class BatchStartResponse(BaseModel):
     message: str
     started_containers: List[ContainerResponse]
+    # 部分容器启动失败时，列出失败的容器及错误原因；已成功启动的容器仍在 started_containers 中
+    failed_containers: List[str] = Field(default_factory=list, description="启动失败的容器及其错误描述。")
 
 # --- 新增的模型 ---
 
@@ -1,17 +1,24 @@
 # 容器服务的业务逻辑将在这里实现 
 
+import asyncio
 import docker
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from uuid import uuid4
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import redis # 导入 redis
-import json # 导入 json 用于序列化
+import redis.asyncio
+import orjson # 导入 orjson 用于序列化
 import httpx
+import requests
 import logging
 
 from src.containers.models import Container
@@ -31,6 +38,38 @@ logger = logging.getLogger(__name__)
 
 VNC_PORT_START = 30000  # VNC 端口的起始分配号
 REDIS_ALERT_PREFIX = "container_alert:" # 定义 Redis 中警报键的前缀
+ALERT_SCAN_BATCH_SIZE = 500 # 遍历警报键时每批处理的数量
+REDIS_NEXT_VNC_PORT_KEY = "dispider:next_vnc_port" # Redis 中记录最后分配的 VNC 端口的计数器
+MAX_PARALLEL_CONTAINER_STARTS = 10 # 批量启动时并发调用 Docker API 的最大线程数，与 Docker 客户端连接池大小一致
+DOCKER_PING_INTERVAL_SECONDS = 30 # 复用 Docker 客户端时，两次连通性检查之间的最小间隔
+
+# PushMe 通知共用的 HTTP 客户端，复用连接池，避免每条通知都重新建立 TCP/TLS 连接
+_push_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_push_client() -> httpx.AsyncClient:
+    """
+    获取共用的 PushMe HTTP 客户端，首次使用时创建。
+    """
+    global _push_client
+    if _push_client is None:
+        _push_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            timeout=5.0,
+        )
+    return _push_client
+
+
+async def close_push_client():
+    """
+    关闭共用的 PushMe HTTP 客户端，在应用关闭时调用。
+    """
+    global _push_client
+    if _push_client is not None:
+        await _push_client.aclose()
+        _push_client = None
+
 
 async def _send_push_notification(push_key: str, title: str, content: str):
     """
@@ -44,27 +83,41 @@ async def _send_push_notification(push_key: str, title: str, content: str):
     logger.info(f"  - 标题: {title}")
     logger.info(f"  - 内容: {content}")
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                "https://push.i-i.me",
-                data={
-                    "push_key": push_key,
-                    "title": title,
-                    "content": content
-                }
-            )
-            response.raise_for_status()  # 如果状态码是 4xx 或 5xx，则引发异常
-            
-            if response.text == "success":
-                logger.info("推送通知已成功发送。")
-            else:
-                logger.error(f"发送推送通知失败，PushMe 返回: {response.text}")
+    try:
+        response = await _get_push_client().post(
+            "https://push.i-i.me",
+            data={
+                "push_key": push_key,
+                "title": title,
+                "content": content
+            }
+        )
+        response.raise_for_status()  # 如果状态码是 4xx 或 5xx，则引发异常
+        
+        if response.text == "success":
+            logger.info("推送通知已成功发送。")
+        else:
+            logger.error(f"发送推送通知失败，PushMe 返回: {response.text}")
+
+    except httpx.HTTPStatusError as e:
+        logger.error(f"发送推送通知请求失败，状态码: {e.response.status_code}，响应: {e.response.text}")
+    except httpx.RequestError as e:
+        logger.error(f"发送推送通知时发生网络请求错误: {e}")
 
-        except httpx.HTTPStatusError as e:
-            logger.error(f"发送推送通知请求失败，状态码: {e.response.status_code}，响应: {e.response.text}")
-        except httpx.RequestError as e:
-            logger.error(f"发送推送通知时发生网络请求错误: {e}")
+
+def _container_list_columns():
+    """
+    列表接口只需要 ContainerResponse 中的字段，只加载这些列以减少传输和对象构造开销。
+    """
+    return load_only(
+        Container.id,
+        Container.container_id,
+        Container.container_name,
+        Container.worker_id,
+        Container.host_port,
+        Container.status,
+        Container.project_id,
+    )
 
 
 class ContainerService:
@@ -72,59 +125,160 @@ class ContainerService:
     处理与 Docker 容器相关的业务逻辑。
     """
 
+    def __init__(self):
+        self._docker_client = None
+        self._docker_client_checked_at = 0.0
+        self._docker_client_lock = threading.Lock()
+
     def _get_docker_client(self):
         """
         获取并验证 Docker 客户端。
+
+        客户端在进程内复用，只在首次使用或距上次检查超过 DOCKER_PING_INTERVAL_SECONDS 时才 ping 一次，
+        检查失败时丢弃缓存的客户端，下次调用重新创建。
         """
-        try:
-            client = docker.from_env()
-            client.ping()
+        now = time.monotonic()
+        client = self._docker_client
+        if client is not None and now - self._docker_client_checked_at < DOCKER_PING_INTERVAL_SECONDS:
             return client
-        except docker.errors.DockerException as e:
+
+        try:
+            with self._docker_client_lock:
+                if self._docker_client is None:
+                    self._docker_client = docker.from_env(max_pool_size=MAX_PARALLEL_CONTAINER_STARTS)
+                self._docker_client.ping()
+                self._docker_client_checked_at = now
+                return self._docker_client
+        except (docker.errors.DockerException, requests.exceptions.RequestException) as e:
+            # 复用的客户端 ping 失败时抛出的是 requests 的连接错误，而不是 DockerException
+            self._docker_client = None
             logger.error(f"无法连接到 Docker 守护进程: {e}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Docker 服务不可用，请确保 Docker 正在运行。"
             )
 
-    def _get_next_available_port(self, db: Session) -> int:
+    def _get_last_allocated_port(self, db: Session) -> int:
         """
-        计算下一个可用的宿主机端口号。
-        通过查询数据库中最新的记录并解析其端口号来确保唯一性。
+        从数据库中最新的容器记录解析出最后分配的端口号。
+        仅在 Redis 端口计数器不存在时（首次部署或 Redis 数据丢失）用于初始化计数器。
         """
         # 按 ID 降序查询最新的容器记录
         latest_container = db.query(Container).order_by(Container.id.desc()).first()
         
-        # 如果数据库中还没有任何容器，则从起始端口开始
+        # 如果数据库中还没有任何容器，则下一个分配的端口是起始端口
         if not latest_container or not latest_container.host_port:
             logger.info(f"数据库中无容器记录，将从起始端口 {VNC_PORT_START} 开始分配。")
-            return VNC_PORT_START
+            return VNC_PORT_START - 1
         
         try:
             # 从 "http://hostname:port" 格式的字符串中解析出端口号
-            latest_port_str = latest_container.host_port.split(':')[-1]
-            latest_port = int(latest_port_str)
-            logger.info(f"找到当前最大端口号: {latest_port}，下一个可用端口将是 {latest_port + 1}。")
-            return latest_port + 1
+            latest_port = int(latest_container.host_port.split(':')[-1])
+            logger.info(f"找到当前最大端口号: {latest_port}，将以此初始化端口计数器。")
+            return latest_port
         except (ValueError, IndexError):
-            # 如果解析失败（例如格式不正确），则记录警告并返回起始端口
+            # 如果解析失败（例如格式不正确），则记录警告并从起始端口开始
             logger.warning(
                 f"无法从 host_port ('{latest_container.host_port}') 中解析出有效的端口号。"
                 f"将回退到起始端口 {VNC_PORT_START}。"
             )
-            return VNC_PORT_START
+            return VNC_PORT_START - 1
+
+    def _reserve_ports(self, db: Session, redis_client: redis.Redis, count: int) -> int:
+        """
+        通过 Redis 计数器原子地预留一段连续的宿主机端口。
+
+        并发的批量启动请求各自获得互不重叠的端口区间。
+
+        Args:
+            db: 数据库会话，仅在计数器不存在时用于初始化。
+            redis_client: Redis 客户端实例。
+            count: 需要预留的端口数量。
+
+        Returns:
+            预留区间的第一个端口号。
+        """
+        if not redis_client.exists(REDIS_NEXT_VNC_PORT_KEY):
+            # nx=True 保证多个进程同时初始化时只有第一个生效
+            redis_client.set(REDIS_NEXT_VNC_PORT_KEY, self._get_last_allocated_port(db), nx=True)
+        return redis_client.incrby(REDIS_NEXT_VNC_PORT_KEY, count) - count + 1
+
+    def _launch_container(self, client, image: str, container_name: str, environment: Dict[str, str],
+                          volumes_mapping: Dict[str, Dict[str, str]], host_port: int):
+        """
+        启动单个 Docker 容器并重新加载其网络信息。
+
+        只与 Docker 守护进程交互，不触碰数据库会话，因此可以在工作线程中并发执行。
+
+        Returns:
+            启动后的 docker 容器对象。
+
+        Raises:
+            docker.errors.APIError: 如果启动容器失败。
+        """
+        # 准备端口映射参数
+        ports_mapping = {'8080/tcp': host_port}
+
+        # 指定 network 参数，确保工作容器和后端在同一个网络中
+        # 这样后端才能通过容器名解析并代理 VNC 连接
+        docker_container = client.containers.run(
+            image=image,
+            detach=True,
+            environment=environment,
+            name=container_name,
+            ports=ports_mapping,
+            volumes=volumes_mapping,
+            shm_size='512m',  # 增加共享内存大小，防止浏览器崩溃
+            network='dispider_backend_dispider-net',  # 确保与 docker-compose.yml 中定义的网络一致
+            # Chrome浏览器运行所需的安全配置
+            cap_add=['SYS_ADMIN'],  # 添加系统管理员权限，Chrome沙盒模式需要
+            security_opt=['seccomp=unconfined'],  # 取消seccomp限制，允许Chrome执行某些系统调用
+            privileged=True  # 特权模式运行，确保Chrome能正常启动（可选，如果上面两个参数足够可以设为False）
+        )
+
+        # 重新加载容器对象以获取网络信息
+        docker_container.reload()
+        return docker_container
+
+    def _assign_proxy(self, docker_container, container_name: str):
+        """
+        为新启动的容器分配代理组。
 
-    def start_container_batch(self, db: Session, project_id: int, request: BatchStartRequest) -> List[Container]:
+        对 Clash 配置文件的修改由代理管理器的规则写入线程串行执行，并把同一时间窗口内的
+        多次分配合并为一次写入和热加载，因此可以在工作线程中并发调用。
+        """
+        # 为新容器分配代理。代理分配失败不影响容器本身的启动状态，因此这里捕获所有异常，
+        # 包括容器网络信息缺失时读取 IP 地址抛出的 KeyError
+        try:
+            container_ip = docker_container.attrs['NetworkSettings']['Networks']['dispider_backend_dispider-net']['IPAddress']
+            assigned_group = proxy_manager_service.assign_proxy_to_container(container_ip)
+            logger.info(f"为容器 {container_name} ({container_ip}) 分配了代理组 '{assigned_group}'。")
+        except Exception as e:
+            # 如果代理分配失败，这是一个需要关注的问题。
+            # 可以选择停止并移除容器，或者仅仅记录一个错误。
+            # 这里我们先记录错误，并让容器继续运行。
+            logger.error(f"CRITICAL: 为容器 {container_name} 分配代理失败: {e}", exc_info=True)
+
+    def start_container_batch(self, db: Session, redis_client: redis.Redis, project_id: int, request: BatchStartRequest) -> Tuple[List[Container], List[str]]:
         """
         为指定项目启动一批爬虫容器，并将信息存入数据库。
 
+        数据库操作按批进行：先一次性插入所有 'creating' 状态的记录，
+        再并发启动 Docker 容器，最后一次性提交所有状态更新。
+        部分容器启动失败时，失败的记录标记为 'error'，成功的记录标记为 'running'，
+        两者都会提交，并把部分成功的结果返回给调用方，避免客户端重试时重复启动已成功的容器。
+
         Args:
             db: 数据库会话。
+            redis_client: Redis 客户端实例，用于分配端口。
             project_id: 项目的 ID。
             request: 包含启动数量和镜像信息的请求对象。
 
         Returns:
-            一个包含所有成功创建的 Container ORM 对象的列表。
+            (成功启动的 Container ORM 对象列表, 启动失败的容器及其错误描述列表) 元组。
+
+        Raises:
+            HTTPException: 如果所有容器都启动失败，或保存容器状态时出错。
         """
         client = self._get_docker_client()
         
@@ -140,9 +294,30 @@ class ContainerService:
         api_base_url = settings.API_BASE_URL
         
         # 为本次批量操作获取起始端口号
-        next_port = self._get_next_available_port(db)
-
-        created_containers_orm = []
+        next_port = self._reserve_ports(db, redis_client, request.container_count)
+
+        # 所有容器共用的挂载配置
+        # 1. 自动挂载项目的工作目录
+        # DOCKER_SPACE_OUTER 是宿主机上为各项目准备的根目录
+        # 此时我们假定该目录已在项目创建时被正确生成，这里不再重复创建。
+        host_project_path = os.path.join(settings.DOCKER_SPACE_OUTER, str(project_id))
+        container_project_path = "/home/user/task"
+        volumes_mapping = {host_project_path: {'bind': container_project_path, 'mode': 'rw'}}
+        logger.info(f"为项目 {project_id} 的容器自动挂载项目目录: {host_project_path} -> {container_project_path}")
+
+        # 2. 如果用户在请求中提供了额外的卷，则合并它们
+        if request.volumes:
+            # 将 {"host_path": "container_path"} 转换为 docker-py 需要的格式
+            # 并合并到总的挂载配置中
+            logger.info(f"合并用户提供的自定义挂载卷: {request.volumes}")
+            volumes_mapping.update({
+                host_path: {'bind': container_path, 'mode': 'rw'}
+                for host_path, container_path in request.volumes.items()
+            })
+
+        # 第一阶段：为本批次的所有容器准备启动参数，并一次性写入 'creating' 状态的数据库记录
+        launch_specs = []
+        db_containers = []
         for i in range(request.container_count):
             worker_id = str(uuid4())
             container_name = f"dispider-worker-{project_id}-{worker_id[:8]}"
@@ -165,31 +340,7 @@ class ContainerService:
             if request.proxy_config:
                 environment.update(request.proxy_config)
 
-            # 准备卷挂载参数
-            volumes_mapping = {}
-
-            # 1. 自动挂载项目的工作目录
-            # DOCKER_SPACE_OUTER 是宿主机上为各项目准备的根目录
-            # 此时我们假定该目录已在项目创建时被正确生成，这里不再重复创建。
-            host_project_path = os.path.join(settings.DOCKER_SPACE_OUTER, str(project_id))
-            container_project_path = "/home/user/task"
-            
-            volumes_mapping[host_project_path] = {'bind': container_project_path, 'mode': 'rw'}
-            logger.info(f"为容器 {container_name} 自动挂载项目目录: {host_project_path} -> {container_project_path}")
-
-            # 2. 如果用户在请求中提供了额外的卷，则合并它们
-            if request.volumes:
-                # 将 {"host_path": "container_path"} 转换为 docker-py 需要的格式
-                # 并合并到总的挂载配置中
-                logger.info(f"合并用户为容器 {container_name} 提供的自定义挂载卷: {request.volumes}")
-                user_volumes = {
-                    host_path: {'bind': container_path, 'mode': 'rw'}
-                    for host_path, container_path in request.volumes.items()
-                }
-                volumes_mapping.update(user_volumes)
-            
-            # 1. 在数据库中创建一个记录，状态为 'creating'
-            db_container = Container(
+            db_containers.append(Container(
                 container_name=container_name,
                 image=request.image,
                 status='creating',
@@ -197,73 +348,83 @@ class ContainerService:
                 worker_id=worker_id,
                 container_id='pending', # 临时值
                 host_port=settings.CONTAINER_HOST + ":" + str(current_host_port), # 记录分配的url
+            ))
+            launch_specs.append((container_name, environment, current_host_port))
+
+        try:
+            db.add_all(db_containers)
+            db.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"为项目 {project_id} 创建容器记录时出错: {e}", exc_info=True)
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"创建容器记录时发生错误: {e}"
             )
-            db.add(db_container)
-            
-            try:
-                db.commit()
-                db.refresh(db_container)
-
-                # 准备端口映射参数
-                ports_mapping = {'8080/tcp': current_host_port}
-
-                # 2. 启动 Docker 容器
-                # 指定 network 参数，确保工作容器和后端在同一个网络中
-                # 这样后端才能通过容器名解析并代理 VNC 连接
-                docker_container = client.containers.run(
-                    image=request.image,
-                    detach=True,
-                    environment=environment,
-                    name=container_name,
-                    ports=ports_mapping,
-                    volumes=volumes_mapping,
-                    shm_size='512m',  # 增加共享内存大小，防止浏览器崩溃
-                    network='dispider_backend_dispider-net',  # 确保与 docker-compose.yml 中定义的网络一致
-                    # Chrome浏览器运行所需的安全配置
-                    cap_add=['SYS_ADMIN'],  # 添加系统管理员权限，Chrome沙盒模式需要
-                    security_opt=['seccomp=unconfined'],  # 取消seccomp限制，允许Chrome执行某些系统调用
-                    privileged=True  # 特权模式运行，确保Chrome能正常启动（可选，如果上面两个参数足够可以设为False）
+
+        # 第二阶段：在线程池中并发启动 Docker 容器（每次启动都是一次阻塞的 Docker API 调用），
+        # 工作线程只返回 docker 容器对象，数据库会话留在当前线程中处理；代理分配随后在线程池中并发执行
+        max_workers = min(MAX_PARALLEL_CONTAINER_STARTS, len(launch_specs))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._launch_container,
+                    client, request.image, container_name, environment, volumes_mapping, current_host_port
                 )
+                for container_name, environment, current_host_port in launch_specs
+            ]
 
-                # 重新加载容器对象以获取网络信息
-                docker_container.reload()
-                container_ip = docker_container.attrs['NetworkSettings']['Networks']['dispider_backend_dispider-net']['IPAddress']
-                
-                # 为新容器分配代理
-                try:
-                    assigned_group = proxy_manager_service.assign_proxy_to_container(container_ip)
-                    print(f"Assigned proxy group '{assigned_group}' to container {container_name} ({container_ip})")
-                except Exception as e:
-                    # 如果代理分配失败，这是一个需要关注的问题。
-                    # 可以选择停止并移除容器，或者仅仅记录一个错误。
-                    # 这里我们先打印错误，并让容器继续运行。
-                    print(f"CRITICAL: Failed to assign proxy to container {container_name}. Error: {e}")
-
-
-                # 3. 更新数据库记录，填入真实的 container_id 和状态
-                db_container.container_id = docker_container.id
-                db_container.status = 'running'
-                db.commit()
-                db.refresh(db_container)
-
-                created_containers_orm.append(db_container)
-                logger.info(f"容器 {container_name} (ID: {docker_container.short_id}) 已成功启动并记录到数据库。")
-
-            except (docker.errors.APIError, SQLAlchemyError) as e:
-                logger.error(f"启动容器 {container_name} 或更新数据库时出错: {e}", exc_info=True)
-                db.rollback()
-                # 尝试将失败的容器记录状态更新为 error
+        started = []
+        failed_containers = []
+        for db_container, (container_name, _, _), future in zip(db_containers, launch_specs, futures):
+            try:
+                docker_container = future.result()
+            except Exception as e:
+                # 除 Docker API 错误外，docker-py 底层的连接错误、超时等也会从这里抛出
+                logger.error(f"启动容器 {container_name} 时出错: {e}", exc_info=True)
+                # 将失败的容器记录状态更新为 error
                 db_container.status = 'error'
-                db.commit()
-                # 此处可以决定是继续尝试下一个还是直接失败
-                # 我们选择直接抛出异常，中断本次批量操作
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"启动容器 {container_name} 时发生错误: {e}"
-                )
+                failed_containers.append(f"{container_name}: {e}")
+                continue
+            started.append((db_container, container_name, docker_container))
+
+        # 并发为启动成功的容器分配代理，这些分配会被合并为一次 Clash 配置写入和热加载；
+        # _assign_proxy 自行记录并吞掉分配失败，不影响容器状态
+        if started:
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_CONTAINER_STARTS, len(started))) as executor:
+                for _, container_name, docker_container in started:
+                    executor.submit(self._assign_proxy, docker_container, container_name)
+
+        created_containers_orm = []
+        for db_container, container_name, docker_container in started:
+            # 3. 更新数据库记录，填入真实的 container_id 和状态
+            db_container.container_id = docker_container.id
+            db_container.status = 'running'
+            created_containers_orm.append(db_container)
+            logger.info(f"容器 {container_name} (ID: {docker_container.short_id}) 已成功启动。")
+
+        # 无论是否有容器启动失败，都先保存所有容器的最终状态
+        try:
+            db.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"更新项目 {project_id} 的容器状态时出错: {e}", exc_info=True)
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"更新容器状态时发生错误: {e}"
+            )
+
+        if failed_containers and not created_containers_orm:
+            # 全部失败时以第一个失败的容器报告错误
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"启动容器时发生错误: {failed_containers[0]}"
+            )
+        if failed_containers:
+            logger.warning(f"项目 {project_id} 有 {len(failed_containers)} 个容器启动失败: {failed_containers}")
         
         logger.info(f"成功为项目 {project_id} 启动并记录了 {len(created_containers_orm)} 个容器。")
-        return created_containers_orm
+        return created_containers_orm, failed_containers
 
     def list_containers(self, db: Session, current_user: User) -> List[Container]:
         """
@@ -280,26 +441,17 @@ class ContainerService:
         """
         if current_user.is_super_admin:
             logger.info(f"超级管理员 {current_user.username} 请求获取所有容器列表。")
-            return db.query(Container).order_by(Container.id.desc()).all()
+            return db.query(Container).options(_container_list_columns()).order_by(Container.id.desc()).all()
         else:
             logger.info(f"用户 {current_user.username} 请求获取其参与项目的容器列表。")
-            # 1. 查找用户参与的所有项目 ID
-            user_project_ids = db.query(ProjectMember.project_id).filter(
+            # 通过成员关系表直接连接，一次查询取回用户参与的所有项目下的容器
+            return db.query(Container).options(_container_list_columns()).join(
+                ProjectMember, ProjectMember.project_id == Container.project_id
+            ).filter(
                 ProjectMember.user_id == current_user.id
-            ).all()
-            
-            # 将元组列表 [(id1,), (id2,)] 转换为 [id1, id2]
-            project_ids = [pid for pid, in user_project_ids]
-
-            if not project_ids:
-                return []
-
-            # 2. 查询这些项目下的所有容器
-            return db.query(Container).filter(
-                Container.project_id.in_(project_ids)
             ).order_by(Container.id.desc()).all()
 
-    def get_container_for_user(self, db: Session, container_db_id: int, current_user: User) -> Optional[Container]:
+    async def get_container_for_user(self, db: AsyncSession, container_db_id: int, current_user: User) -> Optional[Container]:
         """
         获取单个容器的详细信息，并验证当前用户是否有权访问。
 
@@ -307,14 +459,14 @@ class ContainerService:
         - 普通用户只能访问他们作为成员所在项目下的容器。
         
         Args:
-            db: 数据库会话。
+            db: 异步数据库会话。
             container_db_id: 要获取的容器在数据库中的 ID。
             current_user: 当前登录的用户。
 
         Returns:
             如果用户有权访问，则返回 Container 对象，否则返回 None。
         """
-        db_container = db.query(Container).filter(Container.id == container_db_id).first()
+        db_container = await db.get(Container, container_db_id)
 
         if not db_container:
             return None
@@ -323,10 +475,12 @@ class ContainerService:
             return db_container
         
         # 检查用户是否是该容器所属项目的成员
-        membership = db.query(ProjectMember).filter(
-            ProjectMember.user_id == current_user.id,
-            ProjectMember.project_id == db_container.project_id
-        ).first()
+        membership = (await db.execute(
+            select(ProjectMember.id).where(
+                ProjectMember.user_id == current_user.id,
+                ProjectMember.project_id == db_container.project_id
+            ).limit(1)
+        )).scalar()
 
         if not membership:
             # 用户不是该项目成员，无权访问
@@ -338,7 +492,8 @@ class ContainerService:
         """
         一个辅助方法，根据数据库ID获取容器的 ORM 实例和 Docker 客户端。
         """
-        db_container = db.query(Container).filter(Container.id == container_db_id).first()
+        # Session.get 会先查找会话的身份映射，已加载过的容器不会再次查询数据库
+        db_container = db.get(Container, container_db_id)
         if not db_container:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="数据库中未找到该容器记录。")
         
@@ -350,20 +505,17 @@ class ContainerService:
         db_container, client = self._get_container_and_client(db, container_db_id)
         
         try:
-            container = client.containers.get(db_container.container_id)
-            container.stop()
-            db_container.status = 'exited'
-            db.commit()
-            logger.info(f"容器 {db_container.container_name} (ID: {db_container.id}) 已成功停止。")
-        except docker.errors.NotFound:
-            logger.warning(f"尝试停止容器时，Docker 中未找到 ID 为 {db_container.container_id} 的容器。可能已被手动移除。")
-            db_container.status = 'unknown' # 标记为未知状态
+            # 与批量停止共用同一个 Docker 操作；容器不存在时返回 'unknown' 状态
+            db_container.status = self._stop_docker_container(client, db_container.container_id)
             db.commit()
         except docker.errors.APIError as e:
             logger.error(f"停止容器 {db_container.container_name} 时发生 Docker API 错误: {e}", exc_info=True)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="停止容器时发生 Docker API 错误。")
-        
-        db.refresh(db_container)
+
+        if db_container.status == 'unknown':
+            logger.warning(f"尝试停止容器时，Docker 中未找到 ID 为 {db_container.container_id} 的容器。可能已被手动移除。")
+        else:
+            logger.info(f"容器 {db_container.container_name} (ID: {db_container.id}) 已成功停止。")
         return db_container
 
     def restart_container(self, db: Session, container_db_id: int) -> Container:
@@ -371,8 +523,8 @@ class ContainerService:
         db_container, client = self._get_container_and_client(db, container_db_id)
 
         try:
-            container = client.containers.get(db_container.container_id)
-            container.restart()
+            # 直接使用底层 API 客户端，一次 HTTP 调用完成重启
+            client.api.restart(db_container.container_id)
             db_container.status = 'running'
             db.commit()
             logger.info(f"容器 {db_container.container_name} (ID: {db_container.id}) 已成功重启。")
@@ -384,7 +536,6 @@ class ContainerService:
             logger.error(f"重启容器 {db_container.container_name} 时发生 Docker API 错误: {e}", exc_info=True)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="重启容器时发生 Docker API 错误。")
         
-        db.refresh(db_container)
         return db_container
 
     def remove_container(self, db: Session, container_db_id: int):
@@ -437,22 +588,65 @@ class ContainerService:
             logger.info(f"项目 {project_id} 中没有需要停止的活动容器。")
             return 0
 
-        stopped_count = 0
-        for db_container in containers_to_stop:
+        try:
+            client = self._get_docker_client()
+        except HTTPException:
+            # Docker 不可用时不阻断调用方（例如删除项目），与逐个停止失败时的处理保持一致
+            logger.error(f"Docker 服务不可用，无法停止项目 {project_id} 的 {len(containers_to_stop)} 个容器。")
+            return 0
+
+        # 在线程池中并发停止所有 Docker 容器，工作线程只返回新的状态，数据库更新留在当前线程统一执行
+        max_workers = min(MAX_PARALLEL_CONTAINER_STARTS, len(containers_to_stop))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._stop_docker_container, client, db_container.container_id)
+                for db_container in containers_to_stop
+            ]
+
+        ids_by_status: Dict[str, List[int]] = {}
+        for db_container, future in zip(containers_to_stop, futures):
             try:
-                # 调用单个停止方法，复用其逻辑
-                self.stop_container(db, db_container.id)
-                stopped_count += 1
+                new_status = future.result()
             except Exception as e:
-                # 即使单个容器停止失败，也继续尝试停止其他容器
+                # 即使单个容器停止失败，也继续处理其他容器
                 logger.error(f"在批量停止项目 {project_id} 的容器时，停止容器 {db_container.id} 失败: {e}", exc_info=True)
-        
+                continue
+            if new_status == 'unknown':
+                logger.warning(f"尝试停止容器时，Docker 中未找到 ID 为 {db_container.container_id} 的容器。可能已被手动移除。")
+            ids_by_status.setdefault(new_status, []).append(db_container.id)
+
+        # 每种目标状态只执行一条 UPDATE，最后统一提交
+        for new_status, container_ids in ids_by_status.items():
+            db.query(Container).filter(Container.id.in_(container_ids)).update(
+                {Container.status: new_status}
+            )
+        db.commit()
+
+        stopped_count = sum(len(ids) for ids in ids_by_status.values())
+        logger.info(f"项目 {project_id} 的 {stopped_count} 个容器已停止。")
         return stopped_count
 
+    def _stop_docker_container(self, client, container_id: str) -> str:
+        """
+        停止单个 Docker 容器，不触碰数据库会话，可在工作线程中执行。
+
+        Returns:
+            容器应记录的新状态：成功停止为 'exited'，Docker 中不存在为 'unknown'。
+
+        Raises:
+            docker.errors.APIError: 如果停止容器失败。
+        """
+        try:
+            # 直接使用底层 API 客户端，一次 HTTP 调用完成停止，无需先 containers.get 查询容器
+            client.api.stop(container_id)
+            return 'exited'
+        except docker.errors.NotFound:
+            return 'unknown'
+
     async def report_status(
         self,
-        db: Session,
-        redis_client: redis.Redis,
+        db: AsyncSession,
+        redis_client: redis.asyncio.Redis,
         project_id: int,
         worker_id: str,
         status: str,
@@ -462,8 +656,8 @@ class ContainerService:
         处理来自容器的状态报告。
 
         Args:
-            db: 数据库会话。
-            redis_client: Redis 客户端实例。
+            db: 异步数据库会话。
+            redis_client: 异步 Redis 客户端实例。
             project_id: 容器所属的项目 ID。
             worker_id: 报告状态的容器的 worker_id。
             status: 报告的状态，如 'needs_manual_intervention' 或 'running'。
@@ -473,15 +667,17 @@ class ContainerService:
 
         if status == 'needs_manual_intervention':
             # 1. 将警报信息存入 Redis
-            alert_data = {"status": status, "message": message, "project_id": project_id}
-            redis_client.set(redis_key, json.dumps(alert_data))
+            alert_data = {"worker_id": worker_id, "status": status, "message": message, "project_id": project_id}
+            await redis_client.set(redis_key, orjson.dumps(alert_data))
             logger.info(f"Worker {worker_id} 的警报状态已记录到 Redis。")
 
             # 2. 根据 worker_id 查询容器名称以优化通知内容
             container_display_name = worker_id  # 默认使用 worker_id 作为显示名称
-            db_container = db.query(Container).filter(Container.worker_id == worker_id).first()
-            if db_container:
-                container_display_name = db_container.container_name
+            container_name = (await db.execute(
+                select(Container.container_name).where(Container.worker_id == worker_id).limit(1)
+            )).scalar()
+            if container_name:
+                container_display_name = container_name
                 logger.info(f"根据 worker_id '{worker_id}' 找到了对应的容器名: '{container_display_name}'。")
             else:
                 logger.warning(f"无法根据 worker_id '{worker_id}' 找到容器记录，通知中将直接使用 worker_id。")
@@ -489,66 +685,92 @@ class ContainerService:
             # 3. 查询项目的所有者和管理员以发送通知
             try:
                 # 根据新的多对多关系模型，查询项目中所有角色为"所有者"或"管理员"或成员的用户
-                project_managers = db.query(User).join(
-                    ProjectMember, User.id == ProjectMember.user_id
-                ).filter(
-                    ProjectMember.project_id == project_id,
-                    ProjectMember.role.in_([ProjectRole.PROJECT_OWNER, ProjectRole.PROJECT_ADMIN, ProjectRole.PROJECT_MEMBER])
-                ).all()
-
-                if not project_managers:
-                    logger.error(f"无法找到项目 {project_id} 的所有者或管理员来发送通知。")
+                # 只取发送通知需要的两列，并在 SQL 中过滤掉没有配置 pushme_key 的用户
+                recipients = (await db.execute(
+                    select(User.pushme_key, User.username).join(
+                        ProjectMember, User.id == ProjectMember.user_id
+                    ).where(
+                        ProjectMember.project_id == project_id,
+                        ProjectMember.role.in_([ProjectRole.PROJECT_OWNER, ProjectRole.PROJECT_ADMIN, ProjectRole.PROJECT_MEMBER]),
+                        User.pushme_key.isnot(None),
+                        User.pushme_key != ""
+                    )
+                )).all()
+
+                if not recipients:
+                    logger.error(f"项目 {project_id} 中没有配置了 pushme_key 的所有者或管理员，无法发送通知。")
                 else:
                     title = f"容器 '{container_display_name}' 需要人工干预"
                     body = f"项目ID: {project_id}\n容器名: {container_display_name}\n原因: {message or '无具体信息'}"
-                    
-                    for user in project_managers:
-                        if user.pushme_key:
-                            await _send_push_notification(user.pushme_key, title, body)
-                        else:
-                            logger.warning(f"项目 {project_id} 的管理员/所有者 {user.username} 没有配置 pushme_key，无法发送通知。")
+
+                    # 并发发送所有通知，总耗时约为一次请求的往返时间
+                    results = await asyncio.gather(
+                        *(_send_push_notification(pushme_key, title, body) for pushme_key, _ in recipients),
+                        return_exceptions=True
+                    )
+                    for (_, username), result in zip(recipients, results):
+                        if isinstance(result, Exception):
+                            logger.error(f"向用户 {username} 发送推送通知时出错: {result}", exc_info=result)
 
             except SQLAlchemyError as e:
                 logger.error(f"查询项目所有者或管理员以发送通知时发生数据库错误: {e}", exc_info=True)
                 # 即使通知失败，状态也已记录，所以不抛出异常
 
         elif status == 'running':
-            # 如果状态恢复正常，则从 Redis 中删除警报
-            if redis_client.exists(redis_key):
-                redis_client.delete(redis_key)
+            # 如果状态恢复正常，则从 Redis 中删除警报；DEL 对不存在的键返回 0，无需先检查 EXISTS
+            if await redis_client.delete(redis_key):
                 logger.info(f"已收到 Worker {worker_id} 的恢复信号，警报已从 Redis 中移除。")
         else:
             logger.warning(f"收到了一个未知的容器状态报告: '{status}' from worker {worker_id}。")
 
-    def get_all_alerts(self, redis_client: redis.Redis) -> List[Dict[str, Any]]:
+    async def get_all_alerts(self, redis_client: redis.asyncio.Redis) -> List[Dict[str, Any]]:
         """
         从 Redis 中获取所有当前的警报。
 
         Args:
-            redis_client: Redis 客户端实例。
+            redis_client: 异步 Redis 客户端实例。
 
         Returns:
             一个包含所有警报信息的字典列表。
         """
-        alert_keys = redis_client.keys(f"{REDIS_ALERT_PREFIX}*")
         alerts = []
-        if not alert_keys:
-            return alerts
+        # 使用 SCAN 分批遍历警报键，避免 KEYS 在键空间较大时阻塞 Redis；每批键的值通过 pipeline 一次取回
+        alert_keys = []
+        async for key in redis_client.scan_iter(match=f"{REDIS_ALERT_PREFIX}*", count=ALERT_SCAN_BATCH_SIZE):
+            alert_keys.append(key)
+            if len(alert_keys) >= ALERT_SCAN_BATCH_SIZE:
+                await self._collect_alerts(redis_client, alert_keys, alerts)
+                alert_keys = []
+        if alert_keys:
+            await self._collect_alerts(redis_client, alert_keys, alerts)
 
-        alert_values = redis_client.mget(alert_keys)
-        
-        for i, value in enumerate(alert_values):
+        logger.info(f"获取到的警报列表: {alerts}")
+        return alerts
+
+    async def _collect_alerts(self, redis_client: redis.asyncio.Redis, alert_keys: List[str], alerts: List[Dict[str, Any]]):
+        """
+        通过 pipeline 批量读取一组警报键的值，解析后追加到 alerts 中。
+
+        Args:
+            redis_client: 异步 Redis 客户端实例。
+            alert_keys: 本批次的警报键列表。
+            alerts: 用于收集解析结果的列表。
+        """
+        pipe = redis_client.pipeline(transaction=False)
+        for key in alert_keys:
+            pipe.get(key)
+        alert_values = await pipe.execute()
+
+        for key, value in zip(alert_keys, alert_values):
             if value:
                 try:
-                    worker_id = alert_keys[i].replace(REDIS_ALERT_PREFIX, "")
-                    alert_data = json.loads(value)
-                    alert_data['worker_id'] = worker_id
+                    alert_data = orjson.loads(value)
+                    # 旧版本写入的警报数据中没有 worker_id，从键名中还原
+                    if 'worker_id' not in alert_data:
+                        alert_data['worker_id'] = key[len(REDIS_ALERT_PREFIX):]
                     alerts.append(alert_data)
-                except (json.JSONDecodeError, IndexError) as e:
-                    logger.error(f"解析 Redis 中的警报数据时出错 (Key: {alert_keys[i]}): {e}", exc_info=True)
-        
-        logger.info(f"获取到的警报列表: {alerts}")
-        return alerts
+                except orjson.JSONDecodeError as e:
+                    logger.error(f"解析 Redis 中的警报数据时出错 (Key: {key}): {e}", exc_info=True)
 
 
 # 创建一个服务实例，以便在其他地方重用
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -9,12 +11,60 @@ from .config import settings
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 # 创建 SQLAlchemy 引擎
-# connect_args 是特定于 aiosqlite 的，对于 PostgreSQL 不需要
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# - query_cache_size: 调大编译语句缓存，避免热点查询反复编译 SQL
+# - pool_use_lifo: 优先复用最近归还的连接，空闲连接可以自然超时回收
+# - pool_pre_ping: 取出连接前先探活，避免数据库重启后拿到失效连接
+# - pool_recycle: 连接使用超过 30 分钟后重建，避免被中间网络设备静默断开
+# - statement_timeout: PostgreSQL 单条语句最长执行 10 秒，防止卡住的查询长期占用连接池
+# - executemany_mode: psycopg2 下除 INSERT 的多值插入外，批量 UPDATE/DELETE 也通过 execute_batch
+#   合并发送（例如批量启动容器后一次 flush 多个容器的状态更新），避免每行一次往返
+DB_STATEMENT_TIMEOUT_MS = 10000
+
+# 异步引擎只服务于每次执行一条短查询的路径（WebSocket 权限检查、成员查询、状态上报），
+# 使用独立的小连接池，避免两个引擎合计的连接数超过 PostgreSQL 默认的 max_connections=100
+ASYNC_DB_POOL_SIZE = 5
+ASYNC_DB_MAX_OVERFLOW = 10
+
+connect_args = {}
+engine_options = {}
+if SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
+    connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    if make_url(SQLALCHEMY_DATABASE_URL).get_driver_name() == "psycopg2":
+        engine_options["executemany_mode"] = "values_plus_batch"
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    query_cache_size=1200,
+    pool_use_lifo=True,
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=1800,
+    connect_args=connect_args,
+    **engine_options,
+)
 
 # 创建一个 SessionLocal 类
 # sessionmaker 是一个会话工厂，我们将用它来创建独立的数据库会话
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: 提交后保留对象上已写入的属性，返回给响应时不必再查询一次数据库；
+# 需要读取数据库端生成的值时仍应显式调用 db.refresh()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# 创建异步引擎，供运行在事件循环上的路径（WebSocket 代理、容器状态上报）使用
+# 同步 Session 的查询会在 async def 端点中阻塞整个事件循环，这些路径改用 asyncpg 驱动
+ASYNC_SQLALCHEMY_DATABASE_URL = make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql+asyncpg")
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    pool_recycle=1800,
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+)
+
+# expire_on_commit=False: 提交后仍可直接读取已加载的属性，异步会话中不能隐式触发懒加载
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 
 # 创建所有模型类的基类
@@ -38,4 +88,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+
+# 异步数据库会话依赖项
+async def get_async_db():
+    """
+    FastAPI 依赖项：为每个请求创建一个新的 AsyncSession，请求结束后自动关闭。
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,75 @@
+"""
+自定义 ASGI 中间件。
+"""
+
+# 预检请求允许的方法，与 Starlette CORSMiddleware 在 allow_methods=["*"] 时的取值一致
+_ALLOW_METHODS = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+_PREFLIGHT_MAX_AGE = b"600"
+
+
+class FastCORS:
+    """
+    允许任意来源跨域访问的轻量 CORS 中间件。
+
+    等价于 CORSMiddleware(allow_origins=["*"], allow_credentials=True,
+    allow_methods=["*"], allow_headers=["*"])，但响应头在初始化时预先编码为 bytes，
+    并且预检请求 (OPTIONS) 直接在中间件中应答，不再经过路由匹配。
+
+    由于浏览器不接受携带凭据的请求使用 `*` 作为允许的源，这里与 Starlette 的行为一致，
+    回显请求中的 Origin 头。
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._simple_headers = [
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+        self._preflight_headers = [
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-allow-methods", _ALLOW_METHODS),
+            (b"access-control-max-age", _PREFLIGHT_MAX_AGE),
+            (b"vary", b"Origin"),
+            (b"content-length", b"0"),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        # 非跨域请求，原样放行
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        # 预检请求：直接返回允许的方法和请求头，不进入路由
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = [(b"access-control-allow-origin", origin), *self._preflight_headers]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", ()),
+                    (b"access-control-allow-origin", origin),
+                    *self._simple_headers,
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
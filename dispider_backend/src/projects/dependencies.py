@@ -1,8 +1,13 @@
+import threading
+from functools import lru_cache
+from dataclasses import dataclass
 from fastapi import Depends, HTTPException, status, Path
-from sqlalchemy.orm import Session
-from typing import Callable
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable, Optional
 
-from src.database import get_db
+from src.database import get_async_db
 from src.projects.members.models import ProjectMember, ProjectRole
 from src.auth.dependencies import get_current_user
 from src.auth.models import User
@@ -13,52 +18,108 @@ FORBIDDEN_EXCEPTION = HTTPException(
     detail="您没有足够的权限来执行此操作。"
 )
 
-def get_project_member(
+# 定义角色层级，用于权限比较
+# 角色枚举的值是存储在数据库中的字符串，因此用一张固定的查找表表示等级，而不是修改枚举值
+ROLE_LEVELS = {
+    ProjectRole.PROJECT_MEMBER: 1,
+    ProjectRole.PROJECT_OWNER: 2,
+    ProjectRole.PROJECT_ADMIN: 3
+}
+
+@dataclass(frozen=True, slots=True)
+class CachedMember:
+    """
+    权限检查使用的成员关系快照，只包含角色判断所需的字段，不绑定数据库会话。
+    """
+    user_id: int
+    project_id: int
+    role: ProjectRole
+
+
+# 成员角色缓存，键为 (user_id, project_id)，值为角色
+# 同一用户短时间内反复访问同一项目时，省去每个请求一次的成员关系查询。
+# 成员的增删改会通过 invalidate_member_cache 主动失效对应条目。
+MEMBER_CACHE_TTL_SECONDS = 30
+_member_cache = TTLCache(maxsize=10_000, ttl=MEMBER_CACHE_TTL_SECONDS)
+_member_cache_lock = threading.Lock()
+
+
+def invalidate_member_cache(project_id: int, user_id: Optional[int] = None):
+    """
+    使成员角色缓存失效。
+
+    Args:
+        project_id: 项目ID。
+        user_id: 用户ID；为 None 时使该项目下的所有缓存条目失效（例如删除项目时）。
+    """
+    with _member_cache_lock:
+        if user_id is not None:
+            _member_cache.pop((user_id, project_id), None)
+            return
+        for key in [key for key in _member_cache.keys() if key[1] == project_id]:
+            _member_cache.pop(key, None)
+
+
+async def get_project_member(
     project_id: int = Path(..., title="项目ID", description="目标项目的唯一标识符"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user),
-) -> ProjectMember:
+) -> CachedMember:
     """
     一个 FastAPI 依赖，用于从数据库中获取当前用户在指定项目中的成员关系。
 
-    - 如果用户是超级管理员，它将构造一个临时的 ProjectMember 对象，并赋予最高权限（PROJECT_ADMIN），
+    - 如果用户是超级管理员，它将构造一个临时的成员关系快照，并赋予最高权限（PROJECT_ADMIN），
       这样可以确保超级管理员能够通过所有基于角色的权限检查，即使他们不是项目的显式成员。
     - 如果用户不是项目的成员（且不是超级管理员），则会引发 404 Not Found 异常。
-    - 如果找到了成员关系，则返回该 ProjectMember 对象。
+    - 如果找到了成员关系，则返回其快照；查询结果会被短时间缓存。
+
+    该依赖是异步的：缓存命中时直接在事件循环中返回，不再占用线程池中的线程；
+    未命中时通过 AsyncSession 查询，连接仅在实际执行查询时才从连接池中取出。
 
     Args:
         project_id: 从路径参数中自动提取的项目ID。
-        db: 数据库会话依赖。
+        db: 异步数据库会话依赖。
         current_user: 当前已认证的用户依赖。
 
     Returns:
-        与当前用户和项目关联的 ProjectMember ORM 对象。
+        与当前用户和项目关联的成员关系快照 CachedMember。
 
     Raises:
         HTTPException: 如果当前用户不是该项目的成员且不是超级管理员。
     """
     # 如果是超级管理员，则直接授予管理员权限，无需查询数据库
     if current_user.is_super_admin:
-        # 创建一个临时的、未提交到数据库的ProjectMember实例，用于权限检查
-        return ProjectMember(
+        # 创建一个临时的成员关系快照，用于权限检查
+        return CachedMember(
             user_id=current_user.id,
             project_id=project_id,
             role=ProjectRole.PROJECT_ADMIN
         )
 
-    member = db.query(ProjectMember).filter_by(
-        project_id=project_id,
-        user_id=current_user.id
-    ).first()
+    key = (current_user.id, project_id)
+    with _member_cache_lock:
+        role = _member_cache.get(key)
 
-    if not member:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="您不是该项目的成员，或者项目不存在。"
+    if role is None:
+        role = await db.scalar(
+            select(ProjectMember.role).where(
+                ProjectMember.project_id == project_id,
+                ProjectMember.user_id == current_user.id
+            )
         )
-    return member
 
-def ProjectAccessChecker(required_role: ProjectRole) -> Callable[[ProjectMember], ProjectMember]:
+        if role is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="您不是该项目的成员，或者项目不存在。"
+            )
+        with _member_cache_lock:
+            _member_cache[key] = role
+
+    return CachedMember(user_id=current_user.id, project_id=project_id, role=role)
+
+@lru_cache(maxsize=None)
+def ProjectAccessChecker(required_role: ProjectRole) -> Callable[[CachedMember], Awaitable[CachedMember]]:
     """
     权限校验器工厂函数 (Dependency Factory)。
 
@@ -68,26 +129,23 @@ def ProjectAccessChecker(required_role: ProjectRole) -> Callable[[ProjectMember]
     由于 get_project_member 已经处理了超级管理员的情况，
     因此此处的逻辑可以保持不变，它会自动处理超级管理员的权限。
 
+    工厂函数的结果按角色缓存：同一角色总是返回同一个依赖函数对象，
+    FastAPI 会把它们视为同一个依赖（相同的 cache_key），在一次请求内只执行一次。
+
     用法:
     @router.post("/", dependencies=[Depends(ProjectAccessChecker(ProjectRole.PROJECT_OWNER))])
     """
-    # 定义角色层级，用于权限比较
-    role_hierarchy = {
-        ProjectRole.PROJECT_MEMBER: 1,
-        ProjectRole.PROJECT_OWNER: 2,
-        ProjectRole.PROJECT_ADMIN: 3
-    }
-
-    def check_access(member: ProjectMember = Depends(get_project_member)) -> ProjectMember:
+    # 所需的角色等级在创建依赖时计算一次
+    required_role_level = ROLE_LEVELS.get(required_role, 0)
+
+    async def check_access(member: CachedMember = Depends(get_project_member)) -> CachedMember:
         """
         这是实际的 FastAPI 依赖函数。
         它依赖于 get_project_member 来获取用户的成员关系。
         然后，它会比较用户的角色等级和要求的角色等级。
+        只做一次整数比较，声明为 async 以免 FastAPI 为它单独调度一次线程池。
         """
-        user_role_level = role_hierarchy.get(member.role, 0)
-        required_role_level = role_hierarchy.get(required_role, 0)
-
-        if user_role_level < required_role_level:
+        if ROLE_LEVELS.get(member.role, 0) < required_role_level:
             raise FORBIDDEN_EXCEPTION
         
         return member
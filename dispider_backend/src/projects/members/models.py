@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, ForeignKey, Enum as SQLAlchemyEnum, UniqueConstraint
+from sqlalchemy import Column, Integer, ForeignKey, Enum as SQLAlchemyEnum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 
 from src.database import Base
@@ -32,7 +32,13 @@ class ProjectMember(Base):
     project = relationship("Project", back_populates="member_associations")
 
     # 确保一个用户在一个项目中只能有一个角色，避免数据冗余
-    __table_args__ = (UniqueConstraint('project_id', 'user_id', name='_project_user_uc'),)
+    # 唯一约束同时会创建 (project_id, user_id) 唯一索引，支撑权限检查中按项目+用户查找成员的查询
+    # (user_id, project_id) 索引用于按用户查找其参与的项目（list_projects、按成员关系连接容器表），
+    # 其前缀列 user_id 已覆盖单独按 user_id 过滤的查询，无需再建单列索引
+    __table_args__ = (
+        UniqueConstraint('project_id', 'user_id', name='_project_user_uc'),
+        Index('ix_project_members_user_id_project_id', 'user_id', 'project_id'),
+    )
 
     @property
     def username(self) -> str:
@@ -1,5 +1,6 @@
 import enum # 导入 enum
 from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Enum as SQLAlchemyEnum # 导入 Enum
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from src.database import Base
@@ -19,7 +20,10 @@ class Project(Base):
     name = Column(String, index=True, nullable=False)
     # 移除了 owner_id，项目所有者/成员关系由 ProjectMember 表管理
     # owner_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    settings = Column(JSON, nullable=True) # 使用 JSON 类型来存储项目设置，例如 max_retries, timeout
+    # 使用 JSON 类型来存储项目设置，例如 max_retries, timeout
+    # 在 PostgreSQL 上使用 JSONB：以解析后的二进制格式存储，服务端读取和比较时无需重新解析文本；
+    # 目前没有按设置键过滤的查询，因此不额外建立 GIN 索引
+    settings = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     status = Column(SQLAlchemyEnum(ProjectStatus), default=ProjectStatus.ACTIVE, nullable=False) # 新增的状态字段
 
     # 移除了旧的 owner 关系
@@ -1,23 +1,27 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import text
+from sqlalchemy import delete, exists, insert, select, text, update
 import logging
 import os
 import shutil
 import re
+import tempfile
+import threading
 import zipfile
 from fastapi import UploadFile, HTTPException, status
 from typing import Optional, List, Dict, Any
 import docker # 导入 docker 库
 from uuid import uuid4 # 用于生成唯一的 worker_id
 from datetime import datetime, timedelta
+from cachetools import TTLCache
 
 from src.database import get_db
 from src.projects.models import Project
 from src.auth.models import User # 确保 User 被导入
-from src.projects.schemas import ProjectCreate
+from src.projects.schemas import ProjectCreate, MemberResponse, ProjectWithRoleResponse
 from src.projects.models import ProjectStatus # 导入新的 Project 模型和状态枚举
 from src.projects.members.models import ProjectMember, ProjectRole # 导入成员模型和角色
+from src.projects.dependencies import invalidate_member_cache
 from src.containers.service import container_service # 导入容器服务
 from src.config import settings
 
@@ -25,6 +29,17 @@ from src.config import settings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 项目文件列表缓存的有效期（秒）。前端会轮询文件列表，短时间内直接复用上一次的目录扫描结果；
+# 上传新代码包后会主动失效对应条目。
+PROJECT_FILES_CACHE_TTL_SECONDS = 5
+_project_files_cache = TTLCache(maxsize=1024, ttl=PROJECT_FILES_CACHE_TTL_SECONDS)
+_project_files_cache_lock = threading.Lock()
+
+UPLOAD_CHUNK_SIZE = 1 << 20  # 复制上传文件时每次读取的字节数
+
+# ProjectWithRoleResponse 所需的列：项目本身的字段加上当前用户在项目中的角色
+PROJECT_WITH_ROLE_COLUMNS = (Project.id, Project.name, Project.status, Project.settings, ProjectMember.role)
+
 class ProjectService:
     """
     处理与项目相关的业务逻辑。
@@ -68,14 +83,18 @@ class ProjectService:
                 )
                 db.add(new_member)
 
-            # 在提交数据库事务之前，执行文件系统操作
-            # 如果这里失败，可以回滚整个事务
+            db.commit()
+
+            # 提交之后再执行文件系统操作，文件系统较慢（例如网络存储）时不会延长事务和锁的持有时间。
+            # 如果创建目录失败，则删除刚刚提交的项目（成员关系随之级联删除）作为补偿
             project_docker_space = os.path.join(settings.DOCKER_SPACE, str(new_project.id))
-            os.makedirs(project_docker_space, exist_ok=True)
+            try:
+                os.makedirs(project_docker_space, exist_ok=True)
+            except OSError:
+                db.delete(new_project)
+                db.commit()
+                raise
             logger.info(f"为项目 ID {new_project.id} 创建了 Docker 空间目录: {project_docker_space}")
-
-            db.commit()
-            db.refresh(new_project)
             
             logger.info(f"项目 '{project_data.name}' (ID: {new_project.id}) 已成功创建，并将用户 {creator.id} 设置为管理员。")
             return new_project
@@ -85,10 +104,10 @@ class ProjectService:
             db.rollback()
             raise
 
-    def get_project_by_id(self, db: Session, project_id: int, current_user: User) -> Optional[Project]:
+    def get_project_by_id(self, db: Session, project_id: int, current_user: User) -> Optional[ProjectWithRoleResponse]:
         """
         根据ID获取单个项目的详细信息。
-        返回的项目对象会包含当前用户的角色信息。
+        返回的项目会包含当前用户的角色信息。
 
         Args:
             db: 数据库会话。
@@ -96,29 +115,22 @@ class ProjectService:
             current_user: 当前登录的用户。
 
         Returns:
-            如果找到项目，则返回附带角色信息的 Project 对象，否则返回 None。
+            如果找到项目，则返回附带角色信息的项目响应模型，否则返回 None。
         """
         # 使用 LEFT JOIN 来获取当前用户在项目中的角色
         # 这样即使用户不是成员（例如超级管理员查看非自己成员项目），也能获取项目信息
-        query = (
-            db.query(
-                Project,
-                ProjectMember.role
-            )
+        stmt = (
+            select(*PROJECT_WITH_ROLE_COLUMNS)
             .outerjoin(ProjectMember, (Project.id == ProjectMember.project_id) & (ProjectMember.user_id == current_user.id))
-            .filter(Project.id == project_id)
+            .where(Project.id == project_id)
         )
 
-        result = query.first()
-
-        if result:
-            project, role = result
-            project.role = role # 动态添加 role 属性
-            return project
-        
-        return None
+        row = db.execute(stmt).first()
+        if row is None:
+            return None
+        return ProjectWithRoleResponse.model_construct(**row._mapping)
 
-    def add_member(self, db: Session, project_id: int, user_id: int, role: ProjectRole) -> ProjectMember:
+    def add_member(self, db: Session, project_id: int, user_id: int, role: ProjectRole) -> MemberResponse:
         """
         向项目中添加一个新成员。
 
@@ -129,29 +141,57 @@ class ProjectService:
             role: 分配给用户的角色。
 
         Returns:
-            新创建的 ProjectMember 关联对象。
+            新创建成员的响应模型。
         """
-        # 检查用户和项目是否存在
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        # 用一条 SELECT EXISTS(...), EXISTS(...), EXISTS(...) 同时检查用户、项目是否存在以及用户是否已是成员，
+        # 避免三次独立的查询往返
+        user_exists, project_exists, member_exists = db.execute(
+            select(
+                exists().where(User.id == user_id),
+                exists().where(Project.id == project_id),
+                exists().where(
+                    ProjectMember.project_id == project_id,
+                    ProjectMember.user_id == user_id,
+                ),
+            )
+        ).one()
+
+        if not user_exists:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="要邀请的用户不存在。")
         
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
+        if not project_exists:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在。")
 
         # 检查用户是否已经是成员
-        existing_member = db.query(ProjectMember).filter_by(project_id=project_id, user_id=user_id).first()
-        if existing_member:
+        if member_exists:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="该用户已经是此项目的成员。")
 
         try:
-            new_member = ProjectMember(project_id=project_id, user_id=user_id, role=role)
-            db.add(new_member)
+            # INSERT ... RETURNING 放在 CTE 中，并与 users 连接取回用户名，
+            # 一次往返完成插入和响应数据的读取，不再需要 refresh 和用户名的延迟加载
+            new_member = (
+                insert(ProjectMember)
+                .values(project_id=project_id, user_id=user_id, role=role)
+                .returning(
+                    ProjectMember.id,
+                    ProjectMember.user_id,
+                    ProjectMember.project_id,
+                    ProjectMember.role,
+                )
+                .cte("new_member")
+            )
+            stmt = select(
+                new_member.c.id,
+                new_member.c.user_id,
+                new_member.c.project_id,
+                new_member.c.role,
+                User.username,
+            ).join(User, User.id == new_member.c.user_id)
+            row = db.execute(stmt).one()
             db.commit()
-            db.refresh(new_member)
+            invalidate_member_cache(project_id, user_id)
             logger.info(f"已成功将用户 {user_id} 作为 '{role.value}' 添加到项目 {project_id}。")
-            return new_member
+            return MemberResponse.model_construct(**row._mapping)
         except SQLAlchemyError as e:
             db.rollback()
             logger.error(f"添加成员到项目 {project_id} 时发生数据库错误: {e}", exc_info=True)
@@ -166,25 +206,33 @@ class ProjectService:
             project_id: 目标项目ID。
             user_id: 要移除的用户ID。
         """
-        member_to_remove = db.query(ProjectMember).filter_by(project_id=project_id, user_id=user_id).first()
-
-        if not member_to_remove:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="该用户不是此项目的成员。")
-        
-        # 项目管理员不能被移除，只能由超级管理员删除整个项目
-        if member_to_remove.role == ProjectRole.PROJECT_ADMIN:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="不能移除项目的管理员。")
+        # 项目管理员不能被移除，只能由超级管理员删除整个项目。
+        # 这一限制直接写进 DELETE 的条件中，一次往返完成检查和删除，也不存在先查后删之间的竞态。
+        stmt = (
+            delete(ProjectMember)
+            .where(
+                ProjectMember.project_id == project_id,
+                ProjectMember.user_id == user_id,
+                ProjectMember.role != ProjectRole.PROJECT_ADMIN,
+            )
+            .returning(ProjectMember.id)
+            .execution_options(synchronize_session=False)
+        )
 
         try:
-            db.delete(member_to_remove)
+            removed_id = db.execute(stmt).scalar()
+            if removed_id is None:
+                db.rollback()
+                self._raise_member_not_modifiable(db, project_id, user_id, "不能移除项目的管理员。")
             db.commit()
+            invalidate_member_cache(project_id, user_id)
             logger.info(f"已从项目 {project_id} 中成功移除用户 {user_id}。")
         except SQLAlchemyError as e:
             db.rollback()
             logger.error(f"从项目 {project_id} 移除成员时发生数据库错误: {e}", exc_info=True)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="移除成员时发生数据库错误。")
 
-    def update_member_role(self, db: Session, project_id: int, user_id: int, new_role: ProjectRole) -> ProjectMember:
+    def update_member_role(self, db: Session, project_id: int, user_id: int, new_role: ProjectRole) -> MemberResponse:
         """
         更新项目成员的角色。
 
@@ -195,100 +243,128 @@ class ProjectService:
             new_role: 新的角色。
         
         Returns:
-            更新后的 ProjectMember 对象。
+            更新后的成员响应模型。
         """
-        member_to_update = db.query(ProjectMember).filter_by(project_id=project_id, user_id=user_id).first()
-
-        if not member_to_update:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="该用户不是此项目的成员。")
-
-        # 禁止将自己降级或修改管理员角色
-        if member_to_update.role == ProjectRole.PROJECT_ADMIN:
-             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="不能修改项目管理员的角色。")
+        # 禁止修改管理员角色：条件写进 UPDATE，并通过 UPDATE ... FROM users ... RETURNING
+        # 一并取回响应所需的用户名，一次往返完成检查、更新和读取。
+        stmt = (
+            update(ProjectMember)
+            .where(
+                ProjectMember.project_id == project_id,
+                ProjectMember.user_id == user_id,
+                ProjectMember.role != ProjectRole.PROJECT_ADMIN,
+                User.id == ProjectMember.user_id,
+            )
+            .values(role=new_role)
+            .returning(
+                ProjectMember.id,
+                ProjectMember.user_id,
+                ProjectMember.project_id,
+                ProjectMember.role,
+                User.username,
+            )
+            .execution_options(synchronize_session=False)
+        )
 
         try:
-            member_to_update.role = new_role
+            row = db.execute(stmt).first()
+            if row is None:
+                db.rollback()
+                self._raise_member_not_modifiable(db, project_id, user_id, "不能修改项目管理员的角色。")
             db.commit()
-            db.refresh(member_to_update)
+            invalidate_member_cache(project_id, user_id)
             logger.info(f"已成功将项目 {project_id} 中用户 {user_id} 的角色更新为 '{new_role.value}'。")
-            return member_to_update
+            return MemberResponse.model_construct(**row._mapping)
         except SQLAlchemyError as e:
             db.rollback()
             logger.error(f"更新项目成员角色时发生数据库错误: {e}", exc_info=True)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="更新角色时发生数据库错误。")
 
-    def list_members(self, db: Session, project_id: int) -> List[ProjectMember]:
+    def _raise_member_not_modifiable(self, db: Session, project_id: int, user_id: int, admin_detail: str) -> None:
         """
-        列出项目的所有成员，并预加载用户信息以便获取用户名。
+        成员的更新或删除语句没有命中任何行时，区分具体原因并抛出对应的异常。
+
+        Args:
+            db: 数据库会话。
+            project_id: 目标项目ID。
+            user_id: 目标用户ID。
+            admin_detail: 目标成员是项目管理员时返回的错误信息。
+
+        Raises:
+            HTTPException: 用户不是项目成员时为 404，目标成员是项目管理员时为 400。
+        """
+        role = db.scalar(
+            select(ProjectMember.role).where(
+                ProjectMember.project_id == project_id,
+                ProjectMember.user_id == user_id,
+            )
+        )
+        if role is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="该用户不是此项目的成员。")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=admin_detail)
+
+    def list_members(self, db: Session, project_id: int) -> List[MemberResponse]:
+        """
+        列出项目的所有成员，并通过连接查询一并取出用户名。
 
         Args:
             db: 数据库会话。
             project_id: 目标项目ID。
 
         Returns:
-            项目成员ORM对象列表，其中关联的 User 对象已被加载。
+            项目成员响应模型列表。
         """
-        return (
-            db.query(ProjectMember)
-            .options(joinedload(ProjectMember.user))
-            .filter(ProjectMember.project_id == project_id)
-            .all()
+        # 列表接口只读，直接用 Core select 取出响应所需的列，不再实例化 ProjectMember 和 User ORM 对象。
+        # user_id 是非空外键，每个成员必然对应一个用户，因此使用 INNER JOIN。
+        stmt = (
+            select(
+                ProjectMember.id,
+                ProjectMember.user_id,
+                ProjectMember.project_id,
+                ProjectMember.role,
+                User.username,
+            )
+            .join(User, ProjectMember.user_id == User.id)
+            .where(ProjectMember.project_id == project_id)
         )
+        return [MemberResponse.model_construct(**row._mapping) for row in db.execute(stmt)]
 
-    def list_projects(self, db: Session, current_user: User) -> List[Project]:
+    def list_projects(self, db: Session, current_user: User) -> List[ProjectWithRoleResponse]:
         """
         列出项目列表。
         - 如果是超级管理员，则返回所有项目。
         - 如果是普通用户，则只返回其参与的项目。
-        每个项目对象都会被附加一个 'role' 属性，表示当前用户在该项目中的角色。
+        每个项目都会带有 'role' 字段，表示当前用户在该项目中的角色。
 
         Args:
             db: 数据库会话。
             current_user: 当前登录的用户。
 
         Returns:
-            一个 Project 对象的列表，每个对象都带有 'role' 属性。
+            项目响应模型列表，每一项都带有 'role' 字段。
         """
+        # 列表接口只读，直接用 Core select 取出响应所需的列，不再实例化 Project ORM 对象，
+        # 再用 model_construct 构造响应模型（数据来自数据库，无需再次校验）。
         if current_user.is_super_admin:
             logger.info(f"超级管理员 {current_user.username} 请求获取所有项目列表。")
             # 超级管理员获取所有项目
             # 使用 LEFT JOIN 来获取当前用户在每个项目中的角色（如果有）
-            query = (
-                db.query(
-                    Project,
-                    ProjectMember.role
-                )
+            stmt = (
+                select(*PROJECT_WITH_ROLE_COLUMNS)
                 .outerjoin(ProjectMember, (Project.id == ProjectMember.project_id) & (ProjectMember.user_id == current_user.id))
                 .order_by(Project.id.desc())
             )
-            results = query.all()
-            
-            # 将 (Project, role) 元组列表转换为 Project 对象列表，并附加 role 属性
-            projects_with_roles = []
-            for project, role in results:
-                project.role = role # 动态添加 role 属性
-                projects_with_roles.append(project)
-            return projects_with_roles
-
         else:
             logger.info(f"用户 {current_user.username} 请求获取其参与的项目列表。")
             # 普通用户只获取他们是成员的项目
-            # 直接查询 ProjectMember，然后通过 relationship 加载 Project
-            query = (
-                db.query(Project, ProjectMember.role)
+            stmt = (
+                select(*PROJECT_WITH_ROLE_COLUMNS)
                 .join(ProjectMember, Project.id == ProjectMember.project_id)
-                .filter(ProjectMember.user_id == current_user.id)
+                .where(ProjectMember.user_id == current_user.id)
                 .order_by(Project.id.desc())
             )
 
-            results = query.all()
-
-            # 同样地，转换数据结构
-            projects_with_roles = []
-            for project, role in results:
-                project.role = role
-                projects_with_roles.append(project)
-            return projects_with_roles
+        return [ProjectWithRoleResponse.model_construct(**row._mapping) for row in db.execute(stmt)]
 
     def update_project_status(self, db: Session, project_id: int, new_status: ProjectStatus) -> Project:
         """
@@ -305,33 +381,33 @@ class ProjectService:
         Raises:
             HTTPException: 如果项目未找到。
         """
-        # 使用 with_for_update 来锁定项目行，防止在处理过程中其他事务修改项目
-        project = db.query(Project).filter(Project.id == project_id).with_for_update().first()
-
-        if not project:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目未找到")
-
-        # 检查状态是否真的改变了
-        if project.status == new_status:
-            return project # 如果状态没变，直接返回
+        # 用一条带条件的 UPDATE ... RETURNING 完成比较并交换：只有状态与目标不同时才会更新，
+        # 并直接返回更新后的项目，不再先查询、再更新、再 refresh
+        project = db.execute(
+            update(Project)
+            .where(Project.id == project_id, Project.status != new_status)
+            .values(status=new_status)
+            .returning(Project)
+        ).scalar()
+
+        if project is None:
+            # 没有行被更新：项目不存在，或者状态本来就是目标状态（包括被其他请求抢先更新的情况）
+            db.rollback()
+            project = db.get(Project, project_id)
+            if not project:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目未找到")
+            return project # 状态没变，直接返回
 
-        logger.info(f"正在将项目 {project_id} 的状态从 '{project.status.value}' 更新为 '{new_status.value}'...")
+        db.commit()
+        logger.info(f"项目 {project_id} 的状态已更新为 '{new_status.value}'。")
 
-        # 核心逻辑：如果项目被归档，则停止所有相关容器
+        # 核心逻辑：如果项目被归档，则停止所有相关容器。
+        # 停止容器需要逐个调用 Docker，耗时较长，因此放在状态提交之后执行，不在持有项目行锁时进行
         if new_status == ProjectStatus.ARCHIVED:
             logger.info(f"项目 {project_id} 已归档，开始停止所有关联的活动容器...")
-            # 注意：我们在这里直接调用了 container_service 的方法
-            # 这要求 container_service 必须有一个可以批量停止容器的方法
-            # 我们将在下一步中实现它
             stopped_count = container_service.stop_all_containers_for_project(db=db, project_id=project_id)
             logger.info(f"为项目 {project_id} 停止了 {stopped_count} 个容器。")
 
-        # 更新项目状态
-        project.status = new_status
-        db.commit()
-        db.refresh(project)
-
-        logger.info(f"项目 {project_id} 的状态已成功更新为 '{new_status.value}'。")
         return project
 
     def delete_project(self, db: Session, project_id: int):
@@ -372,6 +448,7 @@ class ProjectService:
             logger.info(f"正在从数据库中删除项目 {project_id}...")
             db.delete(project)
             db.commit()
+            invalidate_member_cache(project_id)
             logger.info(f"项目 {project_id} 已被成功删除。")
 
         except (SQLAlchemyError, OSError) as e:
@@ -385,11 +462,12 @@ class ProjectService:
     def upload_code(self, project_id: int, file: UploadFile) -> dict:
         """
         上传、解压并验证项目的代码包。
-        1. 清空项目现有的代码。
-        2. 将上传的 ZIP 包保存到项目专属的 Docker 空间。
-        3. 解压 ZIP 包。
-        4. 验证解压后的代码中是否包含 main.py。
-        5. 如果验证失败，则清空目录并报错。
+        1. 将上传内容复制到临时文件，读取 ZIP 包的中央目录，验证其根目录中是否包含 main.py。
+        2. 如果验证失败，则直接报错，项目现有的代码保持不变。
+        3. 将 ZIP 包解压到与项目目录同一文件系统下的临时目录。
+        4. 解压成功后才清空项目现有的代码，并把解压结果移动到项目专属的 Docker 空间。
+
+        任何一步失败时，项目现有的代码都不会被清空。
 
         Args:
             project_id: 项目的 ID。
@@ -404,42 +482,34 @@ class ProjectService:
             HTTPException: 如果验证失败或发生其他错误。
         """
         project_dir = os.path.join(settings.DOCKER_SPACE, str(project_id))
+        staging_dir = None
         
         try:
-            # 1. 确保项目目录存在，并清空旧内容
-            if os.path.exists(project_dir):
-                logger.info(f"项目 {project_id} 目录已存在，正在清空旧文件...")
-                for filename in os.listdir(project_dir):
-                    file_path = os.path.join(project_dir, filename)
-                    if os.path.isfile(file_path) or os.path.islink(file_path):
-                        os.unlink(file_path)
-                    elif os.path.isdir(file_path):
-                        shutil.rmtree(file_path)
-            else:
-                os.makedirs(project_dir)
-
-            # 2. 保存上传的 zip 文件
-            zip_path = os.path.join(project_dir, "temp_upload.zip")
-            logger.info(f"正在将项目 {project_id} 的代码包保存到: {zip_path}")
-            with open(zip_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            # 3. 解压 zip 文件
-            logger.info(f"正在解压文件: {zip_path}")
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(project_dir)
-
-            # 4. 验证 main.py 是否存在
-            main_py_path = os.path.join(project_dir, 'main.py')
-            if not os.path.isfile(main_py_path):
-                logger.error(f"项目 {project_id} 的代码包验证失败：未找到 main.py 文件。")
-                # 清理已解压的文件
-                shutil.rmtree(project_dir)
-                os.makedirs(project_dir) # 重新创建空目录
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="代码包不合规：必须在根目录包含一个 main.py 文件。"
-                )
+            # Python 3.10 的 SpooledTemporaryFile 没有实现 seekable()，ZipFile 解压时会失败，
+            # 因此先复制到真正的临时文件中再读取
+            with tempfile.TemporaryFile() as zip_file:
+                shutil.copyfileobj(file.file, zip_file, UPLOAD_CHUNK_SIZE)
+                zip_file.seek(0)
+
+                with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+                    # 1. 解压前先根据中央目录验证 main.py 是否存在，验证失败时不会产生任何磁盘写入
+                    if 'main.py' not in zip_ref.namelist():
+                        logger.error(f"项目 {project_id} 的代码包验证失败：未找到 main.py 文件。")
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="代码包不合规：必须在根目录包含一个 main.py 文件。"
+                        )
+
+                    # 2. 解压到 DOCKER_SPACE 下的临时目录，与项目目录位于同一文件系统，之后可以直接重命名
+                    staging_dir = tempfile.mkdtemp(prefix=f".upload-{project_id}-", dir=settings.DOCKER_SPACE)
+                    logger.info(f"正在将项目 {project_id} 的代码包解压到临时目录: {staging_dir}")
+                    zip_ref.extractall(staging_dir)
+
+            # 3. 解压成功后再清空旧内容，并把解压结果移动到项目目录
+            self._clear_project_dir(project_id, project_dir)
+            with os.scandir(staging_dir) as entries:
+                for entry in entries:
+                    os.replace(entry.path, os.path.join(project_dir, entry.name))
 
             logger.info(f"项目 {project_id} 的代码包上传并验证成功。")
             return {"message": "代码包上传、解压并验证成功。"}
@@ -451,12 +521,40 @@ class ProjectService:
             logger.error(f"处理项目 {project_id} 的代码包时发生 I/O 错误: {e}", exc_info=True)
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="存储或解压代码包时发生服务器内部错误。")
         finally:
-            # 确保关闭上传的文件对象
+            # 确保关闭上传的文件对象，并删除解压用的临时目录
             if file and not file.file.closed:
                 file.file.close()
-            # 确保删除临时的 zip 文件
-            if 'zip_path' in locals() and os.path.exists(zip_path):
-                os.remove(zip_path)
+            if staging_dir is not None:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+            # 目录内容可能已经变化，使文件列表缓存失效
+            with _project_files_cache_lock:
+                _project_files_cache.pop(project_id, None)
+
+    def _clear_project_dir(self, project_id: int, project_dir: str) -> None:
+        """
+        清空项目代码目录中的内容；目录不存在时创建它。
+
+        项目目录会以数据卷的形式挂载到正在运行的容器中，因此只删除其中的内容而保留目录本身，
+        否则容器会继续引用已被删除的旧目录。使用 os.scandir 遍历，目录项自带的类型信息
+        可以省去逐个 isfile/isdir 的 stat 调用，也不再预先检查目录是否存在。
+
+        Args:
+            project_id: 项目的 ID。
+            project_dir: 项目代码目录的路径。
+        """
+        try:
+            entries = os.scandir(project_dir)
+        except FileNotFoundError:
+            os.makedirs(project_dir, exist_ok=True)
+            return
+
+        logger.info(f"项目 {project_id} 目录已存在，正在清空旧文件...")
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
 
     def list_project_files(self, project_id: int) -> List[str]:
         """
@@ -468,16 +566,24 @@ class ProjectService:
         Returns:
             一个包含所有文件名的字符串列表。如果目录不存在，则返回空列表。
         """
+        with _project_files_cache_lock:
+            cached = _project_files_cache.get(project_id)
+        if cached is not None:
+            return list(cached)
+
         project_dir = os.path.join(settings.DOCKER_SPACE, str(project_id))
         
-        if not os.path.isdir(project_dir):
-            logger.info(f"请求列出项目 {project_id} 的文件，但其目录不存在: {project_dir}")
-            return []
-        
         try:
-            files = os.listdir(project_dir)
+            # 直接打开目录，不存在时由 FileNotFoundError 处理，省去一次 isdir 检查
+            with os.scandir(project_dir) as entries:
+                files = [entry.name for entry in entries]
+            with _project_files_cache_lock:
+                _project_files_cache[project_id] = tuple(files)
             logger.info(f"成功列出项目 {project_id} 目录下的 {len(files)} 个文件。")
             return files
+        except FileNotFoundError:
+            logger.info(f"请求列出项目 {project_id} 的文件，但其目录不存在: {project_dir}")
+            return []
         except OSError as e:
             logger.error(f"列出项目 {project_id} 的文件时发生 OS 错误: {e}", exc_info=True)
             raise HTTPException(
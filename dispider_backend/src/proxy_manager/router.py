@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
+import re
 import shutil
 from . import service as proxy_manager_service
 from .service import PROVIDERS_PATH
@@ -10,13 +11,20 @@ from typing import Optional
 # 获取一个logger实例
 logger = logging.getLogger(__name__)
 
+# 保存上传的供应商配置文件时每次读写的块大小 (1 MiB)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 合法的供应商配置文件名：单纯的文件名（不含目录分隔符、控制字符和 NUL），不以 '.' 开头，
+# 长度不超过 128，并且以 .yml/.yaml 结尾——合并配置时只会读取这两种扩展名的文件
+PROVIDER_FILENAME_PATTERN = re.compile(r"(?!\.)[^/\\\x00-\x1f]{1,128}\.ya?ml")
+
 router = APIRouter(
     tags=["proxies"],
     # dependencies=[Depends(get_super_admin)]
 )
 
 @router.post("/refresh", summary="刷新并热加载Clash配置")
-async def refresh_clash_configuration():
+def refresh_clash_configuration():
     """
     手动触发Clash配置的刷新流程。
 
@@ -35,39 +43,43 @@ async def refresh_clash_configuration():
         raise HTTPException(status_code=500, detail=f"Failed to refresh Clash configuration: {str(e)}")
 
 @router.post("/providers", summary="上传供应商配置文件")
-async def upload_provider_configuration(file: UploadFile = File(...)):
+def upload_provider_configuration(file: UploadFile = File(...)):
     """
     上传一个新的供应商配置文件 (例如 a.yml)。
 
     文件将被保存到 `clash/providers/` 目录下。
     上传后，您可以选择性地调用 `/refresh` 接口来使配置生效。
     """
-    # 确保 providers 目录存在
-    PROVIDERS_PATH.mkdir(parents=True, exist_ok=True)
-    
-    # 定义文件的保存路径
-    file_path = PROVIDERS_PATH / file.filename
-    
-    # 检查文件名是否安全，防止路径遍历攻击 (简单的实现)
-    if ".." in file.filename or "/" in file.filename:
+    # 在拼接路径之前先检查文件名是否安全，防止路径遍历攻击
+    filename = file.filename or ""
+    if not PROVIDER_FILENAME_PATTERN.fullmatch(filename):
         raise HTTPException(status_code=400, detail="Invalid filename.")
 
+    # 定义文件的保存路径
+    file_path = PROVIDERS_PATH / filename
+
     try:
-        # 将上传的文件内容写入到目标路径
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # 将上传的文件内容写入到目标路径；
+        # providers 目录通常已存在，只有在打开失败时才创建目录，避免每次上传都调用一次 mkdir
+        try:
+            buffer = file_path.open("wb")
+        except FileNotFoundError:
+            PROVIDERS_PATH.mkdir(parents=True, exist_ok=True)
+            buffer = file_path.open("wb")
+        with buffer:
+            shutil.copyfileobj(file.file, buffer, UPLOAD_CHUNK_SIZE)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
     finally:
         file.file.close()
 
     return {
-        "message": f"Successfully uploaded {file.filename} to providers directory.",
+        "message": f"Successfully uploaded {filename} to providers directory.",
         "filepath": str(file_path)
     }
 
 @router.get("/health/groups", summary="获取代理组健康状态")
-async def get_proxy_groups_health():
+def get_proxy_groups_health():
     """
     获取所有代理组的详细健康状态。
     
@@ -86,7 +98,7 @@ async def get_proxy_groups_health():
         raise HTTPException(status_code=500, detail=f"Failed to get health status: {str(e)}")
 
 @router.get("/health/containers", summary="获取容器代理映射")
-async def get_container_proxy_mappings():
+def get_container_proxy_mappings():
     """
     获取所有容器的代理映射关系。
     
@@ -103,7 +115,7 @@ async def get_container_proxy_mappings():
         raise HTTPException(status_code=500, detail=f"Failed to get container mappings: {str(e)}")
 
 @router.get("/health/summary", summary="获取系统健康摘要")
-async def get_system_health_summary():
+def get_system_health_summary():
     """
     获取整个代理系统的健康状况摘要。
     
@@ -123,14 +135,14 @@ async def get_system_health_summary():
         raise HTTPException(status_code=500, detail=f"Failed to get health summary: {str(e)}")
 
 @router.post("/containers/{container_ip}/reassign", summary="手动重新分配容器代理")
-async def force_reassign_container_proxy(container_ip: str):
+def force_reassign_container_proxy(container_ip: str):
     """
     强制重新分配指定容器的代理组。
     
     这个接口会：
     1. 释放容器当前的代理规则
     2. 重新分配一个健康的代理组
-    3. 更新Clash配置并重启服务
+    3. 更新Clash配置并重新加载
     
     适用场景：
     - 容器分配到的代理组不稳定
@@ -150,7 +162,7 @@ async def force_reassign_container_proxy(container_ip: str):
         raise HTTPException(status_code=500, detail=f"Failed to reassign container: {str(e)}")
 
 @router.delete("/health/blacklist", summary="清理代理组黑名单")
-async def clear_proxy_blacklist(group_name: Optional[str] = None):
+def clear_proxy_blacklist(group_name: Optional[str] = None):
     """
     清理代理组黑名单。
     
@@ -175,7 +187,7 @@ async def clear_proxy_blacklist(group_name: Optional[str] = None):
         raise HTTPException(status_code=500, detail=f"Failed to clear blacklist: {str(e)}")
 
 @router.post("/health/initialize", summary="初始化健康监控服务")
-async def initialize_health_services():
+def initialize_health_services():
     """
     初始化代理健康监控服务。
     
@@ -193,7 +205,7 @@ async def initialize_health_services():
         raise HTTPException(status_code=500, detail=f"Failed to initialize health services: {str(e)}")
 
 @router.post("/health/reassign-all", summary="重新分配所有不健康容器")
-async def reassign_unhealthy_containers():
+def reassign_unhealthy_containers():
     """
     手动触发重新分配所有使用不健康代理组的容器。
     
@@ -214,7 +226,7 @@ async def reassign_unhealthy_containers():
         raise HTTPException(status_code=500, detail=f"Failed to reassign containers: {str(e)}")
 
 @router.get("/health/clash-status", summary="检查Clash服务状态")
-async def get_clash_service_status():
+def get_clash_service_status():
     """
     检查Clash服务的整体状态和基本信息。
     
@@ -234,7 +246,7 @@ async def get_clash_service_status():
         raise HTTPException(status_code=500, detail=f"Failed to check Clash status: {str(e)}")
 
 @router.get("/health/diagnose", summary="系统问题诊断")
-async def diagnose_proxy_system():
+def diagnose_proxy_system():
     """
     对整个代理系统进行全面诊断。
     
@@ -258,7 +270,7 @@ async def diagnose_proxy_system():
         raise HTTPException(status_code=500, detail=f"Failed to run diagnosis: {str(e)}")
 
 @router.post("/recovery/container-mappings", summary="恢复容器代理映射数据")
-async def recover_container_mappings():
+def recover_container_mappings():
     """
     从 Clash 配置文件中恢复丢失的容器代理映射数据到 Redis。
     
@@ -280,7 +292,7 @@ async def recover_container_mappings():
         raise HTTPException(status_code=500, detail=f"Failed to recover container mappings: {str(e)}")
 
 @router.post("/initialize", summary="完整初始化代理管理器")
-async def initialize_proxy_manager():
+def initialize_proxy_manager():
     """
     执行代理管理器的完整初始化流程。
     
@@ -1,19 +1,31 @@
+import errno
 import re
 from typing import List, Dict, Any, Optional, Tuple
 import yaml
 import requests
+from requests.adapters import HTTPAdapter
 import os
 from pathlib import Path
 import redis
 import logging
 import time
 import concurrent.futures
+import queue
 import threading
+from dataclasses import dataclass, field
+from cachetools import TTLCache
 from datetime import datetime, timedelta
 
 # 获取一个logger实例
 logger = logging.getLogger(__name__)
 
+# 优先使用 libyaml 的 C 实现进行解析和序列化，速度比纯 Python 实现快一个数量级；
+# 未编译 libyaml 绑定的环境中回退到纯 Python 实现
+try:
+    from yaml import CSafeLoader as _SafeLoader, CSafeDumper as _SafeDumper
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader, SafeDumper as _SafeDumper
+
 # 定义地区关键词，用于从节点名称中识别地理位置
 # 键是标准的地区名称，值是可能出现在节点名称中的关键词列表
 REGION_KEYWORDS: Dict[str, List[str]] = {
@@ -34,11 +46,21 @@ REGION_KEYWORDS: Dict[str, List[str]] = {
     '比利时':['比利时', 'BE', 'Belgium', '布鲁塞尔', 'brussels', 'be'],
 }
 
+# 每个地区的关键词在加载时预编译为一个不区分大小写的正则表达式（关键词之间用 | 连接），
+# 分类时每个地区只需一次 search，而不是对每个关键词分别调用 re.search
+REGION_PATTERNS: Dict[str, re.Pattern] = {
+    region: re.compile("|".join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+    for region, keywords in REGION_KEYWORDS.items()
+}
+
 # 代理组健康状态管理
 PROXY_GROUP_HEALTH_KEY = "proxy_group_health"
 PROXY_GROUP_FAILURE_COUNT_KEY = "proxy_group_failure_count"
 PROXY_GROUP_LAST_CHECK_KEY = "proxy_group_last_check"
-PROXY_GROUP_BLACKLIST_KEY = "proxy_group_blacklist"
+# 黑名单使用有序集合：成员为代理组名称，分值为黑名单到期时间戳，
+# 过期项可以用一次 ZREMRANGEBYSCORE 在服务端清理。
+# 键名与早期版本使用的哈希结构 "proxy_group_blacklist" 不同，避免升级后遇到 WRONGTYPE 错误
+PROXY_GROUP_BLACKLIST_KEY = "proxy_group_blacklist_until"
 
 # 健康检查配置
 HEALTH_CHECK_TIMEOUT = 10  # 秒
@@ -47,6 +69,13 @@ MAX_FAILURE_COUNT = 3  # 最大失败次数
 BLACKLIST_DURATION = 600  # 黑名单持续时间（秒）
 REASSIGN_CHECK_INTERVAL = 120  # 重新分配检查间隔（秒）
 
+# 健康代理组列表的进程内缓存（秒）。分配代理时直接读取缓存，
+# 健康检查一轮结束、黑名单或代理组列表变化时主动失效
+HEALTHY_GROUPS_CACHE_TTL_SECONDS = 5
+_HEALTHY_GROUPS_CACHE_KEY = "healthy_groups"
+_healthy_groups_cache = TTLCache(maxsize=1, ttl=HEALTHY_GROUPS_CACHE_TTL_SECONDS)
+_healthy_groups_cache_lock = threading.Lock()
+
 def generate_proxy_groups(proxies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     根据proxies列表自动生成proxy-groups。
@@ -81,9 +110,9 @@ def generate_proxy_groups(proxies: List[Dict[str, Any]]) -> List[Dict[str, Any]]
 
         proxy_name = proxy.get('name', '')
         found_region = False
-        for region, keywords in REGION_KEYWORDS.items():
-            # 使用正则表达式进行不区分大小写的匹配
-            if any(re.search(keyword, proxy_name, re.IGNORECASE) for keyword in keywords):
+        for region, pattern in REGION_PATTERNS.items():
+            # 使用预编译的正则表达式进行不区分大小写的匹配
+            if pattern.search(proxy_name):
                 regional_nodes[region].append(proxy_name)
                 found_region = True
                 break
@@ -149,11 +178,317 @@ def generate_proxy_groups(proxies: List[Dict[str, Any]]) -> List[Dict[str, Any]]
     return proxy_groups
 
 CLASH_API_URL = "http://clash:9090/configs"
+
+# 所有对 Clash 外部控制器的请求共用一个 Session，复用 keep-alive 连接，
+# 避免健康检查等高频调用每次都重新建立 TCP 连接。连接池大小覆盖健康检查线程池的并发数
+CLASH_HTTP = requests.Session()
+CLASH_HTTP.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0))
 CONFIG_BASE_PATH = Path("clash")
 PROVIDERS_PATH = CONFIG_BASE_PATH / "providers"
 
 REDIS_CLIENT = redis.Redis(host='redis', port=6379, decode_responses=True)
 CONTAINER_PROXY_RULES_KEY = "container_proxy_rules"
+CLASH_RELOAD_TIMEOUT = 5  # 通过 API 热加载配置的超时时间（秒）
+CLASH_CONFIG_PATH = CONFIG_BASE_PATH / "config.yml"
+PROVIDER_PARSE_WORKERS = 8  # 并发解析提供商配置文件的最大线程数
+# 只有两段（类型,目标）的规则类型，例如 MATCH,DIRECT
+TWO_PART_RULE_TYPES = frozenset({'GEOIP', 'MATCH', 'FINAL'})
+
+# 提供商配置文件的解析结果缓存，键为文件名，值为 (文件版本, 代理节点列表)。
+# 文件的修改时间和大小都未变化时直接复用上一次解析出的节点列表，合并配置时只需解析有变化的文件
+_provider_cache: Dict[str, Tuple[Tuple[int, int], List[Any]]] = {}
+_provider_cache_lock = threading.Lock()
+
+# 解析后的 Clash 配置的进程内缓存。只有配置文件的修改时间或大小变化时才重新解析，
+# 分配/释放代理时直接修改缓存中的 rules 列表再序列化写回。
+# 读取、修改、写回和热加载都需要在 _CONFIG_LOCK 内完成，保证缓存与文件一致
+_CONFIG_CACHE: Dict[str, Any] = {"stamp": None, "data": None}
+_CONFIG_LOCK = threading.RLock()
+
+# 在健康代理组中轮询分配的 Lua 脚本：递增轮询索引、在服务端取模选出代理组、
+# 写入容器的分流规则并返回选中的组，一次往返内原子完成，并发分配时不会出现竞争。
+# KEYS[1] 为轮询索引，KEYS[2] 为容器规则哈希；
+# ARGV[1] 为候选组数量 n，ARGV[2..n+1] 为候选组名称，最后一个参数为容器IP
+_ASSIGN_SCRIPT = REDIS_CLIENT.register_script("""
+local idx = redis.call('INCR', KEYS[1])
+local n = tonumber(ARGV[1])
+local pick = ARGV[2 + ((idx - 1) % n)]
+local ip = ARGV[#ARGV]
+redis.call('HSET', KEYS[2], ip, 'SRC-IP-CIDR,' .. ip .. '/32,' .. pick)
+return pick
+""")
+
+def _restart_clash_container():
+    """
+    重启 Clash 容器，使其从磁盘重新加载配置文件。
+
+    Raises:
+        docker.errors.NotFound: 如果未找到名为 'clash' 的容器。
+        Exception: 如果重启失败。
+    """
+    import docker
+    docker_client = docker.from_env()
+    clash_container = docker_client.containers.get('clash')
+    clash_container.restart()
+
+def reload_clash_config(payload: str):
+    """
+    让正在运行的 Clash 加载新的配置内容。
+
+    优先通过 Clash 外部控制器的 PUT /configs 接口直接提交配置内容进行热加载：
+    耗时在毫秒级，且不会中断其他容器正在进行的连接；
+    提交的是配置内容本身而不是文件路径，因此不依赖配置文件在 Clash 容器内的挂载路径。
+    如果热加载失败，则回退到重启 Clash 容器。
+
+    调用方应先将同样的内容写入本地配置文件，保证 Clash 重启后仍使用最新配置。
+
+    Args:
+        payload: 完整的 Clash 配置 YAML 文本。
+
+    Raises:
+        Exception: 如果热加载和重启容器都失败。
+    """
+    try:
+        response = CLASH_HTTP.put(
+            CLASH_API_URL,
+            params={'force': 'true'},
+            json={'payload': payload},
+            timeout=CLASH_RELOAD_TIMEOUT
+        )
+        response.raise_for_status()
+        logger.info("已通过 Clash API 热加载配置")
+        return
+    except requests.RequestException as e:
+        logger.warning(f"通过 Clash API 热加载配置失败，回退到重启 Clash 容器: {e}")
+
+    _restart_clash_container()
+    logger.info("Clash 容器重启成功")
+
+def _config_file_stamp(stat_result: os.stat_result) -> Tuple[int, int]:
+    """用修改时间（纳秒）和文件大小标识配置文件的版本。"""
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+def _invalidate_config_cache():
+    """丢弃缓存的 Clash 配置，下一次读取时重新解析文件。"""
+    with _CONFIG_LOCK:
+        _CONFIG_CACHE["stamp"] = None
+        _CONFIG_CACHE["data"] = None
+
+def _load_clash_config() -> Optional[Dict[str, Any]]:
+    """
+    读取解析后的 Clash 配置，文件未变化时直接返回缓存。
+
+    返回的是缓存中的字典本身，调用方如需修改，必须持有 _CONFIG_LOCK，
+    并在修改后调用 _save_clash_config；修改后未能写回时应调用 _invalidate_config_cache。
+
+    Returns:
+        配置字典；配置文件不存在时返回 None。
+    """
+    with _CONFIG_LOCK:
+        try:
+            stamp = _config_file_stamp(os.stat(CLASH_CONFIG_PATH))
+        except FileNotFoundError:
+            _invalidate_config_cache()
+            return None
+
+        if _CONFIG_CACHE["stamp"] != stamp:
+            with open(CLASH_CONFIG_PATH, 'r', encoding='utf-8') as f:
+                data = yaml.load(f, Loader=_SafeLoader)
+            _CONFIG_CACHE["stamp"] = stamp
+            _CONFIG_CACHE["data"] = data
+        return _CONFIG_CACHE["data"]
+
+def _write_in_place(path: Path, payload: str):
+    """截断并原地写入文件，随后 fsync。目标文件的 inode 保持不变。"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _is_mount_point_file(path: Path) -> bool:
+    """判断文件是否被单独挂载（例如 Docker 单文件绑定挂载），此时它与所在目录位于不同的设备上。"""
+    try:
+        return os.stat(path).st_dev != os.stat(path.parent).st_dev
+    except FileNotFoundError:
+        return False
+
+def _atomic_write(path: Path, payload: str):
+    """
+    原子地替换文件内容：先写入同目录下的临时文件并 fsync，再通过 os.replace 替换目标文件，
+    最后 fsync 所在目录使重命名落盘。读取方只会看到完整的旧文件或完整的新文件。
+
+    替换后目标文件是一个新的 inode，单独挂载的文件无法被替换（os.replace 会报 EBUSY），
+    而且挂载方也看不到新的 inode。因此检测到文件被单独挂载、或替换时报 EBUSY/EXDEV 时，
+    退化为截断后原地写入并 fsync。
+
+    Args:
+        path: 目标文件路径。
+        payload: 要写入的文本内容。
+    """
+    if _is_mount_point_file(path):
+        _write_in_place(path, payload)
+        return
+
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(tmp_path, path)
+    except OSError as e:
+        os.unlink(tmp_path)
+        if e.errno not in (errno.EBUSY, errno.EXDEV):
+            raise
+        logger.warning(f"无法替换 {path}（{e}），改为原地写入")
+        _write_in_place(path, payload)
+        return
+
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def _dump_clash_config(data: Dict[str, Any]) -> str:
+    """
+    将配置序列化为 YAML 文本。
+
+    使用块格式并保持键的原有顺序；width 设为极大值，避免较长的字符串被折行。
+    需要引号的字符串（例如以 [ 开头的代理组名称）由 Dumper 自动加引号。
+    """
+    return yaml.dump(data, Dumper=_SafeDumper, allow_unicode=True, indent=2, sort_keys=False,
+                     default_flow_style=False, width=10**9)
+
+def _save_clash_config(data: Dict[str, Any], payload: Optional[str] = None) -> str:
+    """
+    将配置序列化写入 Clash 配置文件，并更新缓存。
+
+    Args:
+        data: 完整的配置字典。
+        payload: 已经序列化好的 YAML 文本，为 None 时由 data 序列化得到。
+
+    Returns:
+        写入文件的 YAML 文本，可直接用于 reload_clash_config。
+    """
+    with _CONFIG_LOCK:
+        # 调用方通常已经就地修改了缓存中的配置，序列化或写入任何一步失败都要丢弃缓存，
+        # 否则未写入文件的修改会一直留在缓存中，并在下一次写入时被带进配置文件
+        try:
+            if payload is None:
+                payload = _dump_clash_config(data)
+            _atomic_write(CLASH_CONFIG_PATH, payload)
+            _CONFIG_CACHE["stamp"] = _config_file_stamp(os.stat(CLASH_CONFIG_PATH))
+            _CONFIG_CACHE["data"] = data
+        except Exception:
+            _invalidate_config_cache()
+            raise
+    return payload
+
+# 规则写入线程每批最多等待的时间（秒）。窗口内到达的分配/释放请求合并为一次写文件和一次热加载
+RULE_BATCH_WINDOW = 0.2
+# 调用方等待所在批次写入完成的最长时间（秒）
+RULE_UPDATE_TIMEOUT = 60
+
+@dataclass(slots=True)
+class _RuleUpdate:
+    """
+    一次待写入的规则变更，由规则写入线程在批次完成后填写结果并通知调用方。
+    """
+    action: str  # 'add' 表示插入规则，'del' 表示移除规则
+    rule: str
+    done: threading.Event = field(default_factory=threading.Event)
+    applied: bool = False  # 规则是否实际改变了配置（移除时规则可能已不存在）
+    error: Optional[Exception] = None
+
+_rule_queue: "queue.Queue[_RuleUpdate]" = queue.Queue()
+_rule_writer_lock = threading.Lock()
+_rule_writer_thread: Optional[threading.Thread] = None
+
+def _apply_rule_updates(updates: List[_RuleUpdate]):
+    """
+    将一批规则变更按提交顺序应用到缓存的配置上，然后写回文件并热加载一次。
+
+    写回或热加载失败时，错误会记录到该批次的每个变更上。
+    """
+    try:
+        with _CONFIG_LOCK:
+            current_config = _load_clash_config()
+            if current_config is None:
+                raise FileNotFoundError(f"Clash配置文件不存在: {CLASH_CONFIG_PATH}")
+
+            rules = current_config.setdefault('rules', [])
+            changed = False
+            for update in updates:
+                if update.action == 'add':
+                    # 插入到列表顶部，使其优先级最高
+                    rules.insert(0, update.rule)
+                    update.applied = True
+                elif update.rule in rules:
+                    rules.remove(update.rule)
+                    update.applied = True
+                changed = changed or update.applied
+
+            if changed:
+                updated_payload = _save_clash_config(current_config)
+                reload_clash_config(updated_payload)
+                logger.info(f"已合并写入 {len(updates)} 条代理规则变更并重新加载Clash配置")
+    except Exception as e:
+        logger.error(f"批量写入 {len(updates)} 条代理规则变更失败: {e}")
+        for update in updates:
+            update.error = e
+
+def _rule_writer_worker():
+    """
+    规则写入线程：取出队列中的第一个变更后，在 RULE_BATCH_WINDOW 内继续收集后续变更，
+    合并为一次配置写入和一次 Clash 热加载，然后通知这一批的所有调用方。
+    """
+    while True:
+        updates = [_rule_queue.get()]
+        deadline = time.monotonic() + RULE_BATCH_WINDOW
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                updates.append(_rule_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            _apply_rule_updates(updates)
+        finally:
+            for update in updates:
+                update.done.set()
+
+def _submit_rule_update(action: str, rule: str) -> bool:
+    """
+    将规则变更提交给规则写入线程，并等待其所在批次写入完成。
+
+    Args:
+        action: 'add' 插入规则，'del' 移除规则。
+        rule: 规则字符串。
+
+    Returns:
+        规则是否实际改变了配置。
+
+    Raises:
+        TimeoutError: 等待超过 RULE_UPDATE_TIMEOUT 秒。
+        Exception: 写回配置文件或热加载失败时，抛出对应的错误。
+    """
+    global _rule_writer_thread
+    with _rule_writer_lock:
+        if _rule_writer_thread is None:
+            _rule_writer_thread = threading.Thread(target=_rule_writer_worker, daemon=True)
+            _rule_writer_thread.start()
+
+    update = _RuleUpdate(action=action, rule=rule)
+    _rule_queue.put(update)
+    if not update.done.wait(RULE_UPDATE_TIMEOUT):
+        raise TimeoutError(f"等待代理规则写入超时: {rule}")
+    if update.error is not None:
+        raise update.error
+    return update.applied
 
 def test_proxy_group_health(group_name: str) -> Tuple[bool, float]:
     """
@@ -170,10 +505,10 @@ def test_proxy_group_health(group_name: str) -> Tuple[bool, float]:
         test_url = "http://clash:9090/proxies"
         start_time = time.time()
         
-        response = requests.get(f"{test_url}/{group_name}/delay", 
-                              params={'timeout': HEALTH_CHECK_TIMEOUT * 1000, 
-                                     'url': 'http://www.gstatic.com/generate_204'},
-                              timeout=HEALTH_CHECK_TIMEOUT)
+        response = CLASH_HTTP.get(f"{test_url}/{group_name}/delay", 
+                                params={'timeout': HEALTH_CHECK_TIMEOUT * 1000, 
+                                       'url': 'http://www.gstatic.com/generate_204'},
+                                timeout=HEALTH_CHECK_TIMEOUT)
         
         response_time = time.time() - start_time
         
@@ -192,87 +527,181 @@ def test_proxy_group_health(group_name: str) -> Tuple[bool, float]:
         logger.error(f"代理组 {group_name} 健康检查异常: {e}")
         return False, 999.999  # 使用大数值替代无穷大
 
+def evaluate_proxy_groups_from_clash(group_names: List[str]) -> Dict[str, Tuple[bool, float]]:
+    """
+    通过一次 GET /proxies 请求，根据 Clash 已记录的延迟历史评估代理组的健康状态。
+
+    url-test 组会按自己的 interval 定期测速，并把结果记录在各成员节点的 history 中，
+    因此无需再为每个组单独发起一次实时测速（每次测速都会让 Clash 通过该组向外发出探测请求）。
+    组的延迟取成员节点最近一次成功测速中的最小值，与 url-test 选择最快节点的行为一致；
+    Clash 以 delay 为 0 记录失败的测速。
+
+    Args:
+        group_names: 需要评估的代理组名称列表
+
+    Returns:
+        {代理组名称: (is_healthy, response_time)}。在响应中找不到、或成员尚无测速记录的组不包含在结果中，
+        调用方应对这些组回退到 test_proxy_group_health 实时测速。
+    """
+    response = CLASH_HTTP.get("http://clash:9090/proxies", timeout=HEALTH_CHECK_TIMEOUT)
+    response.raise_for_status()
+    proxies = response.json().get('proxies', {})
+
+    results: Dict[str, Tuple[bool, float]] = {}
+    for group_name in group_names:
+        group = proxies.get(group_name)
+        if not group:
+            continue
+
+        has_history = False
+        delays = []
+        for member in group.get('all', []):
+            history = proxies.get(member, {}).get('history')
+            if not history:
+                continue
+            has_history = True
+            delay = history[-1].get('delay', 0)
+            if delay > 0:
+                delays.append(delay)
+
+        if not has_history:
+            continue
+
+        delay = min(delays) if delays else 999999  # 使用大数值替代无穷大
+        # 如果延迟小于5秒，认为是健康的
+        is_healthy = delay < 5000
+        results[group_name] = (is_healthy, min(delay / 1000.0, 999.999))  # 转换为秒，限制最大值
+
+    return results
+
 def update_proxy_group_health(group_name: str, is_healthy: bool, response_time: float):
     """
-    更新代理组健康状态到Redis。
-    
+    更新单个代理组的健康状态到Redis。
+
     Args:
         group_name: 代理组名称
         is_healthy: 是否健康
         response_time: 响应时间
     """
+    update_proxy_groups_health([(group_name, is_healthy, response_time)])
+
+def update_proxy_groups_health(results: List[Tuple[str, bool, float]]):
+    """
+    批量更新一轮健康检查中所有代理组的健康状态到Redis。
+
+    所有组的健康状态、最后检查时间和失败计数的写入放在同一个管道中发送；
+    失败计数由 Redis 的 HINCRBY 原子递增，根据返回的计数决定是否加入黑名单，
+    需要加入黑名单的组再通过一条命令一次性写入。整轮最多两次往返。
+
+    Args:
+        results: (代理组名称, 是否健康, 响应时间) 元组的列表
+    """
+    if not results:
+        return
+
     try:
         current_time = time.time()
-        
-        # 更新健康状态
-        REDIS_CLIENT.hset(PROXY_GROUP_HEALTH_KEY, group_name, 
-                         f"{is_healthy}:{response_time}:{current_time}")
-        
-        # 更新失败计数
-        if not is_healthy:
-            failure_count = REDIS_CLIENT.hincrby(PROXY_GROUP_FAILURE_COUNT_KEY, group_name, 1)
-            logger.warning(f"代理组 {group_name} 失败计数: {failure_count}")
+
+        pipe = REDIS_CLIENT.pipeline(transaction=False)
+        # 记录每个不健康组的 HINCRBY 在管道结果中的位置
+        failure_positions: List[Tuple[str, int]] = []
+        for group_name, is_healthy, response_time in results:
+            # 更新健康状态
+            pipe.hset(PROXY_GROUP_HEALTH_KEY, group_name, 
+                      f"{is_healthy}:{response_time}:{current_time}")
+            # 更新最后检查时间
+            pipe.hset(PROXY_GROUP_LAST_CHECK_KEY, group_name, current_time)
             
-            # 如果失败次数超过阈值，加入黑名单
+            # 更新失败计数
+            if not is_healthy:
+                pipe.hincrby(PROXY_GROUP_FAILURE_COUNT_KEY, group_name, 1)
+                failure_positions.append((group_name, len(pipe) - 1))
+            else:
+                # 健康时重置失败计数
+                pipe.hdel(PROXY_GROUP_FAILURE_COUNT_KEY, group_name)
+                # 从黑名单中移除
+                pipe.zrem(PROXY_GROUP_BLACKLIST_KEY, group_name)
+        replies = pipe.execute()
+
+        # 如果失败次数超过阈值，加入黑名单
+        blacklist_until = current_time + BLACKLIST_DURATION
+        to_blacklist = {}
+        for group_name, position in failure_positions:
+            failure_count = replies[position]
+            logger.warning(f"代理组 {group_name} 失败计数: {failure_count}")
             if failure_count >= MAX_FAILURE_COUNT:
-                blacklist_until = current_time + BLACKLIST_DURATION
-                REDIS_CLIENT.hset(PROXY_GROUP_BLACKLIST_KEY, group_name, blacklist_until)
+                to_blacklist[group_name] = blacklist_until
                 logger.error(f"代理组 {group_name} 已加入黑名单，持续时间: {BLACKLIST_DURATION}秒")
-        else:
-            # 健康时重置失败计数
-            REDIS_CLIENT.hdel(PROXY_GROUP_FAILURE_COUNT_KEY, group_name)
-            # 从黑名单中移除
-            REDIS_CLIENT.hdel(PROXY_GROUP_BLACKLIST_KEY, group_name)
-            
-        # 更新最后检查时间
-        REDIS_CLIENT.hset(PROXY_GROUP_LAST_CHECK_KEY, group_name, current_time)
+        if to_blacklist:
+            REDIS_CLIENT.zadd(PROXY_GROUP_BLACKLIST_KEY, to_blacklist)
         
     except Exception as e:
-        logger.error(f"更新代理组 {group_name} 健康状态失败: {e}")
+        logger.error(f"批量更新 {len(results)} 个代理组的健康状态失败: {e}")
+    finally:
+        # 一轮健康检查结束后，下一次分配重新计算健康代理组
+        _invalidate_healthy_groups_cache()
+
+def _invalidate_healthy_groups_cache():
+    """使健康代理组列表的进程内缓存失效。"""
+    with _healthy_groups_cache_lock:
+        _healthy_groups_cache.pop(_HEALTHY_GROUPS_CACHE_KEY, None)
+
+def _compute_healthy_proxy_groups() -> List[str]:
+    """
+    从Redis读取代理组列表和黑名单，计算健康的代理组列表。
+
+    Returns:
+        健康的代理组名称列表
+
+    Raises:
+        redis.RedisError: 读取Redis失败时抛出
+    """
+    current_time = time.time()
+
+    # 通过一个管道完成：获取所有代理组、在服务端清理过期的黑名单项、获取仍然有效的黑名单
+    pipe = REDIS_CLIENT.pipeline(transaction=False)
+    pipe.lrange('proxy_groups_list', 0, -1)
+    pipe.zrangebyscore(PROXY_GROUP_BLACKLIST_KEY, '-inf', current_time)
+    pipe.zremrangebyscore(PROXY_GROUP_BLACKLIST_KEY, '-inf', current_time)
+    pipe.zrange(PROXY_GROUP_BLACKLIST_KEY, 0, -1)
+    all_groups, expired_groups, _, blacklisted = pipe.execute()
+    current_blacklist = set(blacklisted)
+    
+    for group_name in expired_groups:
+        logger.info(f"代理组 {group_name} 从黑名单中移除（已过期）")
+    
+    # 返回不在黑名单中的组
+    healthy_groups = [group for group in all_groups if group not in current_blacklist]
+    
+    logger.debug(f"健康代理组数量: {len(healthy_groups)}/{len(all_groups)}, "
+                f"黑名单: {list(current_blacklist)}")
+    
+    return healthy_groups
 
 def get_healthy_proxy_groups() -> List[str]:
     """
     获取健康的代理组列表，排除黑名单中的组。
+
+    结果在进程内缓存 HEALTHY_GROUPS_CACHE_TTL_SECONDS 秒，
+    连续分配代理时不必每次都访问Redis。
     
     Returns:
         健康的代理组名称列表
     """
+    with _healthy_groups_cache_lock:
+        cached = _healthy_groups_cache.get(_HEALTHY_GROUPS_CACHE_KEY)
+    if cached is not None:
+        return list(cached)
+
     try:
-        # 获取所有代理组
-        all_groups = REDIS_CLIENT.lrange('proxy_groups_list', 0, -1)
-        
-        # 获取黑名单
-        blacklist = REDIS_CLIENT.hgetall(PROXY_GROUP_BLACKLIST_KEY)
-        current_time = time.time()
-        
-        # 清理过期的黑名单项
-        expired_groups = []
-        for group_name, blacklist_until_str in blacklist.items():
-            try:
-                blacklist_until = float(blacklist_until_str)
-                if current_time > blacklist_until:
-                    expired_groups.append(group_name)
-            except (ValueError, TypeError):
-                expired_groups.append(group_name)  # 无效数据也清理
-        
-        for group_name in expired_groups:
-            REDIS_CLIENT.hdel(PROXY_GROUP_BLACKLIST_KEY, group_name)
-            logger.info(f"代理组 {group_name} 从黑名单中移除（已过期）")
-        
-        # 获取更新后的黑名单
-        current_blacklist = set(REDIS_CLIENT.hkeys(PROXY_GROUP_BLACKLIST_KEY))
-        
-        # 返回不在黑名单中的组
-        healthy_groups = [group for group in all_groups if group not in current_blacklist]
-        
-        logger.debug(f"健康代理组数量: {len(healthy_groups)}/{len(all_groups)}, "
-                    f"黑名单: {list(current_blacklist)}")
-        
+        healthy_groups = _compute_healthy_proxy_groups()
+        with _healthy_groups_cache_lock:
+            _healthy_groups_cache[_HEALTHY_GROUPS_CACHE_KEY] = tuple(healthy_groups)
         return healthy_groups
         
     except Exception as e:
         logger.error(f"获取健康代理组失败: {e}")
-        # 降级：返回所有组
+        # 降级：返回所有组（不写入缓存）
         return REDIS_CLIENT.lrange('proxy_groups_list', 0, -1)
 
 def health_check_worker():
@@ -290,21 +719,39 @@ def health_check_worker():
             if proxy_groups:
                 logger.debug(f"开始健康检查，共 {len(proxy_groups)} 个代理组")
                 
-                # 并行检查所有代理组
-                with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                    future_to_group = {
-                        executor.submit(test_proxy_group_health, group): group 
-                        for group in proxy_groups
-                    }
+                # 先通过一次 GET /proxies 根据 Clash 已有的测速记录评估所有组
+                try:
+                    evaluated = evaluate_proxy_groups_from_clash(proxy_groups)
+                except Exception as e:
+                    logger.warning(f"从 Clash 读取代理延迟记录失败，改为逐个测速: {e}")
+                    evaluated = {}
+
+                # 先收集整轮的检查结果，最后通过管道一次性写入 Redis
+                round_results = [
+                    (group_name, is_healthy, response_time)
+                    for group_name, (is_healthy, response_time) in evaluated.items()
+                ]
+
+                # 没有测速记录的组回退到逐个实时测速，并行检查
+                pending_groups = [group for group in proxy_groups if group not in evaluated]
+                if pending_groups:
+                    logger.debug(f"{len(pending_groups)} 个代理组没有测速记录，逐个进行实时测速")
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+                        future_to_group = {
+                            executor.submit(test_proxy_group_health, group): group 
+                            for group in pending_groups
+                        }
                     
-                    for future in concurrent.futures.as_completed(future_to_group):
-                        group_name = future_to_group[future]
-                        try:
-                            is_healthy, response_time = future.result()
-                            update_proxy_group_health(group_name, is_healthy, response_time)
-                        except Exception as e:
-                            logger.error(f"检查代理组 {group_name} 时发生异常: {e}")
-                            update_proxy_group_health(group_name, False, 999.999)
+                        for future in concurrent.futures.as_completed(future_to_group):
+                            group_name = future_to_group[future]
+                            try:
+                                is_healthy, response_time = future.result()
+                                round_results.append((group_name, is_healthy, response_time))
+                            except Exception as e:
+                                logger.error(f"检查代理组 {group_name} 时发生异常: {e}")
+                                round_results.append((group_name, False, 999.999))
+
+                update_proxy_groups_health(round_results)
                 
                 logger.debug("健康检查轮次完成")
             
@@ -331,8 +778,8 @@ def reassign_unhealthy_containers():
         # 获取所有容器代理规则映射
         container_rules = REDIS_CLIENT.hgetall(CONTAINER_PROXY_RULES_KEY)
         
-        # 获取黑名单代理组
-        blacklisted_groups = set(REDIS_CLIENT.hkeys(PROXY_GROUP_BLACKLIST_KEY))
+        # 获取仍在有效期内的黑名单代理组
+        blacklisted_groups = set(REDIS_CLIENT.zrangebyscore(PROXY_GROUP_BLACKLIST_KEY, time.time(), '+inf'))
         
         if not blacklisted_groups:
             return  # 没有黑名单组，无需重新分配
@@ -399,7 +846,7 @@ def assign_proxy_to_container(container_ip: str) -> str:
     1. 优先分配健康的代理组（不在黑名单中）
     2. 如果所有组都不健康，选择失败次数最少的组
     3. 使用轮询算法在健康组中分配
-    4. 动态更新Clash配置并重启服务
+    4. 动态更新Clash配置并热加载
 
     Args:
         container_ip: 容器在Docker网络中的IP地址。
@@ -411,9 +858,11 @@ def assign_proxy_to_container(container_ip: str) -> str:
     healthy_groups = get_healthy_proxy_groups()
     
     if healthy_groups:
-        # 使用健康组进行轮询分配
-        current_index = REDIS_CLIENT.incr('proxy_group_rr_index')
-        assigned_group = healthy_groups[(current_index - 1) % len(healthy_groups)]
+        # 使用健康组进行轮询分配：选组和记录映射关系由 Lua 脚本原子完成
+        assigned_group = _ASSIGN_SCRIPT(
+            keys=['proxy_group_rr_index', CONTAINER_PROXY_RULES_KEY],
+            args=[len(healthy_groups), *healthy_groups, container_ip]
+        )
         logger.info(f"为容器 {container_ip} 分配健康代理组: {assigned_group}")
     else:
         # 如果没有健康组，选择失败次数最少的组作为兜底
@@ -421,15 +870,14 @@ def assign_proxy_to_container(container_ip: str) -> str:
         if not all_groups:
             # 如果Redis中没有，尝试从本地配置文件获取
             try:
-                clash_config_path = CONFIG_BASE_PATH / "config.yml"
-                if clash_config_path.exists():
-                    with open(clash_config_path, 'r', encoding='utf-8') as f:
-                        current_config = yaml.safe_load(f)
+                current_config = _load_clash_config()
+                if current_config is not None:
                     groups = current_config.get('proxy-groups', [])
                     all_groups = [g['name'] for g in groups if g['type'] == 'url-test']
                     if all_groups:
                         REDIS_CLIENT.delete('proxy_groups_list')
                         REDIS_CLIENT.rpush('proxy_groups_list', *all_groups)
+                        _invalidate_healthy_groups_cache()
                         logger.info(f"从配置文件加载了 {len(all_groups)} 个 url-test 代理组")
                 else:
                     raise FileNotFoundError("Clash配置文件不存在")
@@ -453,40 +901,24 @@ def assign_proxy_to_container(container_ip: str) -> str:
         assigned_group = best_group
         logger.warning(f"所有代理组都不健康，为容器 {container_ip} 分配失败次数最少的组: {assigned_group} (失败次数: {min_failures})")
 
-    # 2. 直接读取本地Clash配置文件
-    clash_config_path = CONFIG_BASE_PATH / "config.yml"
-    if not clash_config_path.exists():
-        raise FileNotFoundError(f"Clash配置文件不存在: {clash_config_path}")
-        
-    with open(clash_config_path, 'r', encoding='utf-8') as f:
-        current_config = yaml.safe_load(f)
-
-    # 3. 创建并添加新规则
+    # 2. 创建新规则
     new_rule = f"SRC-IP-CIDR,{container_ip}/32,{assigned_group}"
-    rules = current_config.get('rules', [])
-    # 插入到列表顶部，使其优先级最高
-    rules.insert(0, new_rule)
-    current_config['rules'] = rules
 
-    # 4. 更新配置到本地文件
-    updated_payload = yaml.dump(current_config, allow_unicode=True, indent=2, sort_keys=False, default_flow_style=False)
-    
     try:
-        with open(clash_config_path, 'w', encoding='utf-8') as f:
-            f.write(updated_payload)
-        
-        # 重启Clash容器
-        import docker
-        docker_client = docker.from_env()
-        clash_container = docker_client.containers.get('clash')
-        clash_container.restart()
-        logger.info(f"为容器 {container_ip} 分配代理组 {assigned_group}，规则已添加并重启Clash")
+        # 3. 将规则插入到配置顶部，更新配置文件并让Clash加载新配置；
+        # 同一时间窗口内的其他分配/释放会合并为一次写入
+        _submit_rule_update('add', new_rule)
+        logger.info(f"为容器 {container_ip} 分配代理组 {assigned_group}，规则已添加并重新加载Clash配置")
     except Exception as e:
         logger.error(f"Failed to update Clash config in assign_proxy_to_container: {e}")
+        if healthy_groups:
+            # 健康组路径下映射关系已由脚本写入，配置更新失败时撤销
+            REDIS_CLIENT.hdel(CONTAINER_PROXY_RULES_KEY, container_ip)
         raise
     
-    # 5. 记录映射关系
-    REDIS_CLIENT.hset(CONTAINER_PROXY_RULES_KEY, container_ip, new_rule)
+    # 4. 记录映射关系（健康组路径下已由脚本写入）
+    if not healthy_groups:
+        REDIS_CLIENT.hset(CONTAINER_PROXY_RULES_KEY, container_ip, new_rule)
 
     return assigned_group
 
@@ -505,41 +937,15 @@ def release_proxy_from_container(container_ip: str):
         return # 规则不存在，直接返回
 
     try:
-        # 直接读取本地配置文件
-        clash_config_path = CONFIG_BASE_PATH / "config.yml"
-        if not clash_config_path.exists():
-            logger.warning(f"Clash配置文件不存在: {clash_config_path}")
-            # 即使文件不存在，也要清理Redis记录
-            REDIS_CLIENT.hdel(CONTAINER_PROXY_RULES_KEY, container_ip)
-            return
-            
-        with open(clash_config_path, 'r', encoding='utf-8') as f:
-            current_config = yaml.safe_load(f)
-
-        # 移除规则
-        rules = current_config.get('rules', [])
-        if rule_to_remove in rules:
-            rules.remove(rule_to_remove)
-            current_config['rules'] = rules
-
-            # 写回本地文件
-            updated_payload = yaml.dump(current_config, allow_unicode=True, indent=2, sort_keys=False, default_flow_style=False)
-            
-            try:
-                with open(clash_config_path, 'w', encoding='utf-8') as f:
-                    f.write(updated_payload)
-                
-                # 重启Clash容器
-                import docker
-                docker_client = docker.from_env()
-                clash_container = docker_client.containers.get('clash')
-                clash_container.restart()
+        # 移除规则，写回本地文件并让Clash加载新配置
+        try:
+            if _submit_rule_update('del', rule_to_remove):
                 logger.info(f"成功移除容器 {container_ip} 的代理规则: {rule_to_remove}")
-            except Exception as e:
-                logger.error(f"Failed to update Clash config in release_proxy_from_container: {e}")
-                # 这里不抛出异常，因为清理操作应该继续
-        else:
-            logger.warning(f"规则 {rule_to_remove} 在配置文件中未找到")
+            else:
+                logger.warning(f"规则 {rule_to_remove} 在配置文件中未找到")
+        except Exception as e:
+            logger.error(f"Failed to update Clash config in release_proxy_from_container: {e}")
+            # 这里不抛出异常，因为清理操作应该继续
 
         # 从Redis中删除记录
         REDIS_CLIENT.hdel(CONTAINER_PROXY_RULES_KEY, container_ip)
@@ -550,6 +956,43 @@ def release_proxy_from_container(container_ip: str):
         REDIS_CLIENT.hdel(CONTAINER_PROXY_RULES_KEY, container_ip)
 
 
+def _parse_provider_file(entry: os.DirEntry) -> Tuple[str, Optional[List[Any]]]:
+    """
+    读取并解析单个提供商配置文件中的代理节点列表。
+
+    Args:
+        entry: providers 目录下提供商配置文件的目录项。
+
+    Returns:
+        (文件名, 代理节点列表) 元组；文件无法解析或格式不正确时列表为 None。
+    """
+    provider_file = entry.name
+    try:
+        stamp = _config_file_stamp(entry.stat())
+        with _provider_cache_lock:
+            cached = _provider_cache.get(provider_file)
+        if cached is not None and cached[0] == stamp:
+            return provider_file, cached[1]
+
+        with open(entry.path, 'r', encoding='utf-8') as f:
+            provider_data = yaml.load(f, Loader=_SafeLoader)
+    except Exception as e:
+        logger.error(f"加载或解析 {provider_file} 时出错: {e}", exc_info=True)
+        return provider_file, None
+
+    if not isinstance(provider_data, dict) or 'proxies' not in provider_data:
+        logger.warning(f"跳过 {provider_file}: 文件不是字典或不包含 'proxies' 键")
+        return provider_file, None
+
+    proxies_list = provider_data.get('proxies', [])
+    if not isinstance(proxies_list, list):
+        logger.warning(f"跳过 {provider_file}: 'proxies' 键不包含列表")
+        return provider_file, None
+
+    with _provider_cache_lock:
+        _provider_cache[provider_file] = (stamp, proxies_list)
+    return provider_file, proxies_list
+
 def merge_and_update_clash_config():
     """
     合并所有提供商的配置，只更新 proxies 和 proxy-groups 部分，保持其他配置不变。
@@ -560,15 +1003,20 @@ def merge_and_update_clash_config():
     3. 只更新现有配置文件的 proxies 和 proxy-groups 字段
     4. 保持 rules、端口等其他配置完全不变
     """
-    clash_config_path = CONFIG_BASE_PATH / "config.yml"
+    # 持有配置锁直到写回和热加载结束，避免与分配/释放代理的规则修改交错
+    with _CONFIG_LOCK:
+        _merge_and_update_clash_config_locked()
+
+def _merge_and_update_clash_config_locked():
+    """merge_and_update_clash_config 的实现，调用方需持有 _CONFIG_LOCK。"""
+    clash_config_path = CLASH_CONFIG_PATH
     
     # 1. 读取现有的完整配置，如果不存在则创建基础配置
     if clash_config_path.exists():
         try:
-            with open(clash_config_path, 'r', encoding='utf-8') as f:
-                current_config = yaml.safe_load(f)
-            if not isinstance(current_config, dict):
-                current_config = {}
+            # 配置会在下面被整体改写，这里取缓存的浅拷贝，写回失败时缓存不受影响
+            loaded_config = _load_clash_config()
+            current_config = dict(loaded_config) if isinstance(loaded_config, dict) else {}
             logger.info("读取现有 Clash 配置文件成功")
         except Exception as e:
             logger.error(f"读取现有配置文件失败: {e}")
@@ -591,35 +1039,37 @@ def merge_and_update_clash_config():
     all_proxies = []
     seen_proxy_names = set()  # 用于检测和移除重复名称的节点
     
-    if os.path.exists(PROVIDERS_PATH):
-        for provider_file in os.listdir(PROVIDERS_PATH):
-            if provider_file.endswith((".yml", ".yaml")):
-                file_path = PROVIDERS_PATH / provider_file
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        provider_data = yaml.safe_load(f)
-                        
-                        if isinstance(provider_data, dict) and 'proxies' in provider_data:
-                            proxies_list = provider_data.get('proxies', [])
-                            if isinstance(proxies_list, list):
-                                for proxy in proxies_list:
-                                    # 确保节点是字典并有名字
-                                    if isinstance(proxy, dict) and 'name' in proxy:
-                                        proxy_name = proxy['name']
-                                        if proxy_name not in seen_proxy_names:
-                                            all_proxies.append(proxy)
-                                            seen_proxy_names.add(proxy_name)
-                                        else:
-                                            logger.warning(f"跳过重复的代理名称 '{proxy_name}' 来自 {provider_file}")
-                            else:
-                                logger.warning(f"跳过 {provider_file}: 'proxies' 键不包含列表")
-                        else:
-                            logger.warning(f"跳过 {provider_file}: 文件不是字典或不包含 'proxies' 键")
-
-                except Exception as e:
-                    logger.error(f"加载或解析 {provider_file} 时出错: {e}", exc_info=True)
-    else:
+    try:
+        with os.scandir(PROVIDERS_PATH) as it:
+            provider_entries = [e for e in it if e.is_file() and e.name.endswith((".yml", ".yaml"))]
+    except FileNotFoundError:
         logger.warning(f"Providers 目录不存在: {PROVIDERS_PATH}")
+        provider_entries = []
+
+    # 清理已被删除的提供商文件的缓存
+    present_files = {e.name for e in provider_entries}
+    with _provider_cache_lock:
+        for stale_file in _provider_cache.keys() - present_files:
+            del _provider_cache[stale_file]
+
+    if provider_entries:
+        # 各提供商文件相互独立，在线程池中并发读取和解析；按文件名排序后再依次合并，去重结果保持确定
+        provider_entries.sort(key=lambda e: e.name)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=PROVIDER_PARSE_WORKERS) as executor:
+            parsed_providers = list(executor.map(_parse_provider_file, provider_entries))
+
+        for provider_file, proxies_list in parsed_providers:
+            if proxies_list is None:
+                continue
+            for proxy in proxies_list:
+                # 确保节点是字典并有名字
+                if isinstance(proxy, dict) and 'name' in proxy:
+                    proxy_name = proxy['name']
+                    if proxy_name not in seen_proxy_names:
+                        all_proxies.append(proxy)
+                        seen_proxy_names.add(proxy_name)
+                    else:
+                        logger.warning(f"跳过重复的代理名称 '{proxy_name}' 来自 {provider_file}")
 
     # 3. 只更新 proxies 和 proxy-groups 字段，保持其他配置不变
     current_config['proxies'] = all_proxies
@@ -629,39 +1079,36 @@ def merge_and_update_clash_config():
     existing_rules = current_config.get('rules', [])
     
     # 获取所有有效的代理组名称
-    valid_proxy_groups = set()
-    for group in current_config.get('proxy-groups', []):
-        valid_proxy_groups.add(group['name'])
+    valid_proxy_groups = {group['name'] for group in current_config.get('proxy-groups', [])}
     valid_proxy_groups.add('DIRECT')  # DIRECT 是内置的有效目标
     
-    # 过滤掉无效的规则（引用不存在的代理组）
+    # 过滤掉无效的规则（引用不存在的代理组），同时在这一遍中记录是否已有 GEOIP 和 MATCH 兜底规则
     valid_rules = []
     invalid_rules_removed = 0
+    has_geoip = False
+    has_match = False
     
     for rule in existing_rules:
-        if isinstance(rule, str):
-            rule_parts = rule.split(',')
-            if len(rule_parts) >= 3:
-                rule_target = rule_parts[-1].strip()  # 规则的目标（最后一部分）
-                if rule_target in valid_proxy_groups:
-                    valid_rules.append(rule)
-                else:
-                    logger.warning(f"移除无效规则（引用不存在的代理组 '{rule_target}'）: {rule}")
-                    invalid_rules_removed += 1
-            elif len(rule_parts) == 2 and rule_parts[0].strip() in ['GEOIP', 'MATCH', 'FINAL']:
-                # 处理 GEOIP,CN,DIRECT 或 MATCH,DIRECT 这样的规则
-                rule_target = rule_parts[-1].strip()
-                if rule_target in valid_proxy_groups:
-                    valid_rules.append(rule)
-                else:
-                    logger.warning(f"移除无效规则（引用不存在的代理组 '{rule_target}'）: {rule}")
-                    invalid_rules_removed += 1
-            else:
-                # 保留其他格式的规则
-                valid_rules.append(rule)
-        else:
+        if not isinstance(rule, str):
             # 保留非字符串规则
             valid_rules.append(rule)
+            continue
+
+        rule_parts = rule.split(',')
+        # 检查目标的规则：至少三段的规则，以及 MATCH,DIRECT 这样的两段规则
+        if len(rule_parts) >= 3 or (len(rule_parts) == 2 and rule_parts[0].strip() in TWO_PART_RULE_TYPES):
+            rule_target = rule_parts[-1].strip()  # 规则的目标（最后一部分）
+            if rule_target not in valid_proxy_groups:
+                logger.warning(f"移除无效规则（引用不存在的代理组 '{rule_target}'）: {rule}")
+                invalid_rules_removed += 1
+                continue
+
+        # 保留的规则（包括其他格式的规则）
+        valid_rules.append(rule)
+        if not has_geoip and 'GEOIP,CN,DIRECT' in rule:
+            has_geoip = True
+        if not has_match and rule.startswith('MATCH,'):
+            has_match = True
     
     if invalid_rules_removed > 0:
         logger.info(f"清理了 {invalid_rules_removed} 个无效规则")
@@ -672,9 +1119,6 @@ def merge_and_update_clash_config():
         logger.info("添加了基础代理规则到配置")
     else:
         # 确保有 GEOIP 和 MATCH 兜底规则
-        has_geoip = any('GEOIP,CN,DIRECT' in str(rule) for rule in valid_rules)
-        has_match = any(str(rule).startswith('MATCH,') for rule in valid_rules)
-        
         if not has_geoip:
             valid_rules.append('GEOIP,CN,DIRECT')
             logger.info("添加 GEOIP,CN,DIRECT 兜底规则")
@@ -690,126 +1134,30 @@ def merge_and_update_clash_config():
     if url_test_groups:
         REDIS_CLIENT.delete('proxy_groups_list')
         REDIS_CLIENT.rpush('proxy_groups_list', *url_test_groups)
+        _invalidate_healthy_groups_cache()
         logger.info(f"更新了 {len(url_test_groups)} 个 url-test 代理组到 Redis 供轮询分配")
 
-    # 6. 手动构建YAML配置字符串以确保正确的格式
-    def format_yaml_value(value):
-        """格式化YAML值，对包含特殊字符的字符串添加引号"""
-        if isinstance(value, str):
-            # 如果字符串包含特殊字符，需要用引号包围
-            special_chars = ['[', ']', '{', '}', ':', '#', '&', '*', '!', '|', '>', "'", '"', '%', '@', '`']
-            if any(char in value for char in special_chars) or value.startswith(' ') or value.endswith(' '):
-                # 使用双引号并转义内部的双引号
-                escaped_value = value.replace('"', '\\"')
-                return f'"{escaped_value}"'
-        return value
-
-    def format_proxy(proxy):
-        """格式化单个代理配置，支持复杂嵌套结构"""
-        name = format_yaml_value(proxy.get('name', ''))
-        lines = [f"  - name: {name}"]
-        
-        for key, value in proxy.items():
-            if key != 'name':
-                if isinstance(value, bool):
-                    lines.append(f"    {key}: {str(value).lower()}")
-                elif isinstance(value, dict):
-                    # 处理嵌套字典，如 ws-opts
-                    lines.append(f"    {key}:")
-                    for sub_key, sub_value in value.items():
-                        if isinstance(sub_value, dict):
-                            lines.append(f"      {sub_key}:")
-                            for sub_sub_key, sub_sub_value in sub_value.items():
-                                formatted_sub_sub_value = format_yaml_value(sub_sub_value)
-                                lines.append(f"        {sub_sub_key}: {formatted_sub_sub_value}")
-                        else:
-                            formatted_sub_value = format_yaml_value(sub_value)
-                            lines.append(f"      {sub_key}: {formatted_sub_value}")
-                elif isinstance(value, list):
-                    # 处理列表
-                    lines.append(f"    {key}:")
-                    for item in value:
-                        if isinstance(item, dict):
-                            lines.append(f"      -")
-                            for item_key, item_value in item.items():
-                                formatted_item_value = format_yaml_value(item_value)
-                                lines.append(f"        {item_key}: {formatted_item_value}")
-                        else:
-                            formatted_item = format_yaml_value(item)
-                            lines.append(f"      - {formatted_item}")
-                else:
-                    formatted_value = format_yaml_value(value)
-                    lines.append(f"    {key}: {formatted_value}")
-        return '\n'.join(lines)
-    
-    def format_proxy_group(group):
-        """格式化代理组配置"""
-        name = format_yaml_value(group.get('name', ''))
-        lines = [f"  - name: {name}"]
-        for key, value in group.items():
-            if key != 'name':
-                if key == 'proxies' and isinstance(value, list):
-                    lines.append(f"    {key}:")
-                    for proxy_name in value:
-                        formatted_proxy_name = format_yaml_value(proxy_name)
-                        lines.append(f"      - {formatted_proxy_name}")
-                else:
-                    formatted_value = format_yaml_value(value)
-                    lines.append(f"    {key}: {formatted_value}")
-        return '\n'.join(lines)
-    
-    # 7. 构建完整的YAML配置
-    yaml_parts = []
-    
-    # 添加基础配置（除了 proxies, proxy-groups, rules）
-    for key, value in current_config.items():
-        if key not in ['proxies', 'proxy-groups', 'rules']:
-            if isinstance(value, bool):
-                yaml_parts.append(f"{key}: {str(value).lower()}")
-            elif isinstance(value, str) and value == '':
-                yaml_parts.append(f"{key}: ''")
-            else:
-                yaml_parts.append(f"{key}: {value}")
-    
-    # 添加proxies
-    yaml_parts.append("proxies:")
-    for proxy in current_config.get('proxies', []):
-        yaml_parts.append(format_proxy(proxy))
-    
-    # 添加proxy-groups
-    yaml_parts.append("proxy-groups:")
-    for group in current_config.get('proxy-groups', []):
-        yaml_parts.append(format_proxy_group(group))
-    
-    # 添加rules（保持原有规则不变）
-    yaml_parts.append("rules:")
-    for rule in current_config.get('rules', []):
-        yaml_parts.append(f"  - {rule}")
-    
-    updated_payload = '\n'.join(yaml_parts)
+    # 6. 序列化为YAML配置字符串
+    updated_payload = _dump_clash_config(current_config)
 
-    # 8. 写入配置文件并重启服务
+    # 7. 写入配置文件并重新加载配置
     try:
         logger.info(f"正在更新 Clash 配置文件: {clash_config_path}")
         logger.debug(f"配置大小: {len(updated_payload)} 字符, 代理节点数: {len(all_proxies)}")
         
-        with open(clash_config_path, 'w', encoding='utf-8') as f:
-            f.write(updated_payload)
+        _save_clash_config(current_config, updated_payload)
         
         logger.info("Clash 配置文件更新成功")
         
-        # 重启Clash容器以重新加载配置
+        # 让Clash加载新配置
         import docker
         try:
-            docker_client = docker.from_env()
-            clash_container = docker_client.containers.get('clash')
-            logger.info("正在重启 Clash 容器以重新加载配置...")
-            clash_container.restart()
-            logger.info("Clash 容器重启成功")
+            logger.info("正在重新加载 Clash 配置...")
+            reload_clash_config(updated_payload)
         except docker.errors.NotFound:
             logger.warning("未找到名为 'clash' 的容器，配置已更新但需要手动重启")
         except Exception as docker_error:
-            logger.error(f"重启 Clash 容器失败: {docker_error}")
+            logger.error(f"重新加载 Clash 配置失败: {docker_error}")
             # 即使重启失败，配置文件已经更新，所以不抛出异常
             
     except Exception as e:
@@ -853,7 +1201,7 @@ def get_proxy_groups_health_status() -> Dict[str, Any]:
         # 获取健康状态
         health_data = REDIS_CLIENT.hgetall(PROXY_GROUP_HEALTH_KEY)
         failure_counts = REDIS_CLIENT.hgetall(PROXY_GROUP_FAILURE_COUNT_KEY)
-        blacklist = REDIS_CLIENT.hgetall(PROXY_GROUP_BLACKLIST_KEY)
+        blacklist = dict(REDIS_CLIENT.zrange(PROXY_GROUP_BLACKLIST_KEY, 0, -1, withscores=True))
         last_checks = REDIS_CLIENT.hgetall(PROXY_GROUP_LAST_CHECK_KEY)
         
         current_time = time.time()
@@ -1032,8 +1380,9 @@ def clear_proxy_group_blacklist(group_name: Optional[str] = None) -> Dict[str, A
     try:
         if group_name:
             # 清理特定组
-            removed = REDIS_CLIENT.hdel(PROXY_GROUP_BLACKLIST_KEY, group_name)
+            removed = REDIS_CLIENT.zrem(PROXY_GROUP_BLACKLIST_KEY, group_name)
             REDIS_CLIENT.hdel(PROXY_GROUP_FAILURE_COUNT_KEY, group_name)
+            _invalidate_healthy_groups_cache()
             
             if removed:
                 logger.info(f"手动清理代理组 {group_name} 的黑名单状态")
@@ -1049,21 +1398,10 @@ def clear_proxy_group_blacklist(group_name: Optional[str] = None) -> Dict[str, A
                     'cleared_groups': []
                 }
         else:
-            # 清理所有过期项
-            blacklist = REDIS_CLIENT.hgetall(PROXY_GROUP_BLACKLIST_KEY)
-            current_time = time.time()
-            expired_groups = []
-            
-            for group_name, blacklist_until_str in blacklist.items():
-                try:
-                    blacklist_until = float(blacklist_until_str)
-                    if current_time > blacklist_until:
-                        expired_groups.append(group_name)
-                except (ValueError, TypeError):
-                    expired_groups.append(group_name)  # 无效数据也清理
-            
-            for group_name in expired_groups:
-                REDIS_CLIENT.hdel(PROXY_GROUP_BLACKLIST_KEY, group_name)
+            # 清理所有过期项：按到期时间取出过期的组，再一次性删除
+            expired_groups = REDIS_CLIENT.zrangebyscore(PROXY_GROUP_BLACKLIST_KEY, '-inf', time.time())
+            if expired_groups:
+                REDIS_CLIENT.zrem(PROXY_GROUP_BLACKLIST_KEY, *expired_groups)
             
             logger.info(f"清理了 {len(expired_groups)} 个过期的黑名单代理组")
             
@@ -1157,7 +1495,7 @@ def check_clash_service_status() -> Dict[str, Any]:
         # 1. 检查基本连接
         try:
             start_time = time.time()
-            response = requests.get('http://clash:9090/version', timeout=5)
+            response = CLASH_HTTP.get('http://clash:9090/version', timeout=5)
             api_response_time = time.time() - start_time
             
             if response.status_code == 200:
@@ -1177,7 +1515,7 @@ def check_clash_service_status() -> Dict[str, Any]:
         # 2. 获取配置信息
         if status['service_reachable']:
             try:
-                config_response = requests.get('http://clash:9090/configs', timeout=5)
+                config_response = CLASH_HTTP.get('http://clash:9090/configs', timeout=5)
                 if config_response.status_code == 200:
                     config_data = config_response.json()
                     status['current_mode'] = config_data.get('mode', 'unknown')
@@ -1191,7 +1529,7 @@ def check_clash_service_status() -> Dict[str, Any]:
         # 3. 获取代理信息
         if status['service_reachable']:
             try:
-                proxies_response = requests.get('http://clash:9090/proxies', timeout=10)
+                proxies_response = CLASH_HTTP.get('http://clash:9090/proxies', timeout=10)
                 if proxies_response.status_code == 200:
                     proxies_data = proxies_response.json()
                     proxies = proxies_data.get('proxies', {})
@@ -1331,13 +1669,10 @@ def recover_container_mappings_from_config():
     """
     try:
         # 读取 Clash 配置文件
-        clash_config_path = CONFIG_BASE_PATH / "config.yml"
-        if not clash_config_path.exists():
-            logger.warning(f"Clash 配置文件不存在: {clash_config_path}")
+        current_config = _load_clash_config()
+        if current_config is None:
+            logger.warning(f"Clash 配置文件不存在: {CLASH_CONFIG_PATH}")
             return
-            
-        with open(clash_config_path, 'r', encoding='utf-8') as f:
-            current_config = yaml.safe_load(f)
         
         rules = current_config.get('rules', [])
         recovered_count = 0
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 import os
 from dotenv import load_dotenv
 import logging
@@ -30,6 +31,15 @@ except Exception as e:
     logger.error(f"创建 Redis 连接池失败: {e}", exc_info=True)
     redis_pool = None
 
+# 供异步路由使用的连接池，与上面的同步连接池使用相同的配置
+# 在 async def 路由中调用同步客户端会阻塞事件循环，因此异步路径使用 redis.asyncio
+async_redis_pool = redis.asyncio.ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    decode_responses=True
+)
+
 def get_redis_client():
     """
     提供一个依赖注入函数，用于从连接池中获取一个 Redis 客户端实例。
@@ -53,6 +63,16 @@ def get_redis_client():
         logger.error(f"无法连接到 Redis: {e}", exc_info=True)
         raise ConnectionError("无法连接到 Redis，请确认服务正在运行。")
 
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """
+    提供一个依赖注入函数，用于从异步连接池中获取一个 redis.asyncio 客户端实例。
+    连接在第一次执行命令时才会建立，因此这里不做 ping 检查。
+
+    Returns:
+        A redis.asyncio.Redis client instance.
+    """
+    return redis.asyncio.Redis(connection_pool=async_redis_pool)
+
 # 这是一个可以直接使用的 Redis 客户端实例，主要用于非 FastAPI 应用部分或简单脚本
 # 在 FastAPI 的依赖注入中，推荐使用 get_redis_client()
 redis_client = get_redis_client() if redis_pool else None 
\ No newline at end of file
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import text
+from sqlalchemy import exists, select, text
 import logging
 import re
 from fastapi import HTTPException, status
@@ -17,6 +17,20 @@ class TaskService:
     """
     处理与项目任务相关的业务逻辑。
     """
+    def _ensure_project_exists(self, db: Session, project_id: int):
+        """
+        检查项目是否存在。只执行 SELECT EXISTS(...)，不加载 Project 对象。
+
+        Args:
+            db: 数据库会话。
+            project_id: 项目ID。
+
+        Raises:
+            HTTPException: 如果项目未找到。
+        """
+        if not db.scalar(select(exists().where(Project.id == project_id))):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"ID为 {project_id} 的项目未找到。")
+
     def _validate_column_names(self, columns: List[str]):
         """
         验证列名是否符合安全规范。
@@ -74,9 +88,7 @@ class TaskService:
             return [row[0] for row in db.execute(columns_query, {'table_name': table_name}).fetchall()]
 
         try:
-            project_exists = db.query(Project).filter(Project.id == project_id).first()
-            if not project_exists:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"ID为 {project_id} 的项目未找到。")
+            self._ensure_project_exists(db, project_id)
 
             all_task_columns = get_table_columns(tasks_table_name)
             all_result_columns = get_table_columns(results_table_name)
@@ -403,9 +415,7 @@ class TaskService:
         获取指定项目任务表的用户自定义列名。
         如果任务表不存在，则返回一个空列表。
         """
-        project_exists = db.query(Project).filter(Project.id == project_id).first()
-        if not project_exists:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"ID为 {project_id} 的项目未找到。")
+        self._ensure_project_exists(db, project_id)
 
         tasks_table_name = f'project_{project_id}_tasks'
         
@@ -436,9 +446,7 @@ class TaskService:
         获取指定项目结果表的用户自定义列名。
         如果结果表不存在，则返回一个空列表。
         """
-        project_exists = db.query(Project).filter(Project.id == project_id).first()
-        if not project_exists:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"ID为 {project_id} 的项目未找到。")
+        self._ensure_project_exists(db, project_id)
         
         results_table_name = f'project_{project_id}_results'
 
@@ -469,9 +477,7 @@ class TaskService:
         计算并返回项目的任务完成进度，以浮点数表示（保留四位小数）。
         如果任务表不存在或没有任务，则返回 0.0。
         """
-        project_exists = db.query(Project).filter(Project.id == project_id).first()
-        if not project_exists:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"ID为 {project_id} 的项目未找到。")
+        self._ensure_project_exists(db, project_id)
 
         tasks_table_name = f'project_{project_id}_tasks'
         
@@ -506,9 +512,7 @@ class TaskService:
         获取项目结果表的总行数。
         如果结果表不存在，返回 0。
         """
-        project_exists = db.query(Project).filter(Project.id == project_id).first()
-        if not project_exists:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"ID为 {project_id} 的项目未找到。")
+        self._ensure_project_exists(db, project_id)
 
         results_table_name = f'project_{project_id}_results'
 